@@ -0,0 +1,123 @@
+#!/usr/bin/python3
+
+# Asset daemon: watches the level and sprite sources and rebuilds them as
+# soon as they change, without starting new Python processes.
+#
+# Run it from the project directory next to "make run".  The interpreter,
+# NumPy, Pillow and the palette tables stay loaded, and the build cache
+# keeps the file hashes in memory, so saving a map in Tiled only recompiles
+# that map plus the index files.  Changing the tools themselves restarts
+# the daemon so the new code is used.
+
+import argparse
+import glob
+import os
+import sys
+import time
+import traceback
+from x16assets import build_levels, build_sprites, x16pack
+from x16assets.buildcache import BuildCache
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+TOOL_PATTERNS = [os.path.join(TOOLS_DIR, "*.py"), os.path.join(TOOLS_DIR, "x16assets", "*.py")]
+
+#What each build reads
+WATCHED = {
+	"sprites": ["sprite.cfg", "images/*.png", "images/*.spritesheet"],
+	"levels": ["levels.cfg", "tilemaps/*.json", "*.remap.json"],
+}
+
+#Modification time and size of every file matching the patterns
+def snapshot(patterns):
+	files = {}
+	for pattern in patterns:
+		for filename in glob.glob(pattern):
+			try:
+				stat = os.stat(filename)
+			except OSError:
+				continue #deleted while we looked
+			files[filename] = (stat.st_mtime_ns, stat.st_size)
+	return files
+
+def changed_files(old, new):
+	return sorted(filename for filename in set(old) | set(new) if old.get(filename) != new.get(filename))
+
+def log(message):
+	print("[%s] %s" % (time.strftime("%H:%M:%S"), message))
+	sys.stdout.flush()
+
+#Runs one build and reports what it wrote.  A broken asset (e.g. a file
+# caught half saved) is reported and the daemon keeps watching.
+def build(name, cache, args):
+	start = time.perf_counter()
+	try:
+		if(name == "sprites"):
+			written = build_sprites(args.sprites, cache, args.jobs)
+		else:
+			written = [result.map_filename() for result in build_levels(args.levels, cache, args.jobs, x16pack.CODECS[args.compress], args.entitygrid, args.packbanks)]
+	except Exception:
+		log("%s build failed:\n%s" % (name, traceback.format_exc()))
+		return
+	elapsed = (time.perf_counter() - start) * 1000
+	if(len(written) > 0):
+		log("%s: rebuilt %s in %.1f ms" % (name, ", ".join(written), elapsed))
+	else:
+		log("%s: up to date (%.1f ms)" % (name, elapsed))
+
+#Replaces this process with a fresh copy, used when the tools change
+def restart():
+	log("tools changed, restarting")
+	os.execv(sys.executable, [sys.executable] + sys.argv)
+
+parser = argparse.ArgumentParser(formatter_class=argparse.RawTextHelpFormatter,
+	description='Watches the maps, sprite sheets and configs and rebuilds them when they change.\n\n'
+	'Examples:\n\n'
+	'assetd.py\n'
+	'assetd.py -interval 0.1\n'
+	'assetd.py -compress rle16 -packbanks\n')
+parser.add_argument('-levels', default='levels.cfg', help='the level config file')
+parser.add_argument('-sprites', default='sprite.cfg', help='the sprite config file')
+parser.add_argument('-interval', type=float, default=0.25, help='seconds between checks for changes, default: 0.25')
+parser.add_argument('-jobs', type=int, default=1, help='number of assets to convert in parallel, 0 for one per CPU, default: 1')
+#The .MAP format options of buildlevels.py, so a rebuild keeps the format of the tree
+parser.add_argument('-entitygrid', action='store_true', help='add the entity grid to the entity banks, like buildlevels.py -entitygrid')
+parser.add_argument('-packbanks', action='store_true', help='share banks between the entity tables and tilemaps, like buildlevels.py -packbanks')
+parser.add_argument('-compress', choices=sorted(x16pack.CODECS), default='none', help='pack the .MAP files like buildlevels.py -compress, default: none')
+parser.add_argument('-once', action='store_true', help='bring everything up to date and exit')
+args = parser.parse_args()
+args.jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+
+WATCHED["sprites"][0] = args.sprites
+WATCHED["levels"][0] = args.levels
+
+cache = BuildCache()
+tools = snapshot(TOOL_PATTERNS)
+state = {name: snapshot(patterns) for name, patterns in WATCHED.items()}
+for name in WATCHED:
+	build(name, cache, args)
+if(args.once):
+	sys.exit(0)
+
+log("watching %s" % ", ".join(pattern for patterns in WATCHED.values() for pattern in patterns))
+try:
+	while(True):
+		time.sleep(args.interval)
+		if(snapshot(TOOL_PATTERNS) != tools):
+			restart()
+		dirty = [name for name, patterns in WATCHED.items() if snapshot(patterns) != state[name]]
+		if(len(dirty) == 0):
+			continue
+
+		#Editors may write a file in several steps, wait until it settles
+		while(True):
+			current = {name: snapshot(patterns) for name, patterns in WATCHED.items()}
+			time.sleep(min(args.interval, 0.05))
+			if(current == {name: snapshot(patterns) for name, patterns in WATCHED.items()}):
+				break
+
+		for name in dirty:
+			log("%s changed: %s" % (name, ", ".join(changed_files(state[name], current[name]))))
+			state[name] = current[name]
+			build(name, cache, args)
+except KeyboardInterrupt:
+	pass
@@ -0,0 +1,189 @@
+#!/usr/bin/python3
+
+# Benchmarks for the asset pipeline.  Times each stage of map compilation
+# (parse, encode, compile, write) and sprite conversion (parse, load,
+# quantize, pack, write) on synthetic maps and sheets, then runs the real
+# build tools on a copy of the repo's assets as a baseline.  Results are
+# written as JSON so runs can be compared with -compare.
+#
+#	python3 tools/bench/bench.py -output bench.json
+#	python3 tools/bench/bench.py -quick -compare bench.json
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+TOOLS_DIR = os.path.dirname(BENCH_DIR)
+REPO_DIR = os.path.dirname(TOOLS_DIR)
+sys.path.insert(0, TOOLS_DIR)
+
+import numpy as np
+import PIL
+from PIL import Image
+import synthetic
+from x16assets import levels, sprites
+from x16assets.tiledmap import encode_tilemap, load_tiled
+
+#(name, width, height, layers, entities)
+MAPS = [
+	("map32", 32, 32, 2, 20),
+	("map64", 64, 64, 3, 60),
+	("map128", 128, 128, 4, 150),
+	("map256", 256, 256, 4, 300),
+]
+QUICK_MAPS = MAPS[:2]
+
+#(name, frames, width, height, colors)
+SHEETS = [
+	("sheet8", 16, 8, 8, 4),
+	("sheet16", 64, 16, 16, 8),
+	("sheet32", 64, 32, 32, 15),
+	("sheet64", 32, 64, 64, 15),
+]
+QUICK_SHEETS = SHEETS[:2]
+
+#Runs fn repeat times and returns the best wall time and the last result
+def timed(fn, repeat):
+	best = None
+	for i in range(repeat):
+		start = time.perf_counter()
+		result = fn()
+		elapsed = time.perf_counter() - start
+		if(best is None or elapsed < best):
+			best = elapsed
+	return best, result
+
+def bench_map(filename, repeat):
+	stages = {}
+	stages["parse"], data = timed(lambda: load_tiled(filename), repeat)
+	layers = [levels.Map(layer["properties"][0]["value"], layer) for layer in data["layers"] if layer["type"] == "tilelayer"]
+	stages["encode"], encoded = timed(lambda: [encode_tilemap(map.data, map.width, map.height) for map in layers], repeat)
+	stages["compile"], result = timed(lambda: levels.compile_level(filename), repeat)
+	stages["write"], _ = timed(result.write, repeat)
+	tiles = sum(map.width * map.height for map in layers)
+	return {"stages": stages, "tiles": tiles, "bytes": len(result.map_bytes)}
+
+def bench_sheet(spritename, tilemode, repeat):
+	stages = {}
+	stages["parse"], sheet = timed(lambda: sprites.readSpriteSheet(spritename, tilemode), repeat)
+	stages["load"], pixels = timed(lambda: np.array(Image.open(sheet.filename)), repeat)
+	stages["quantize"], indexes = timed(lambda: sprites.quantize(pixels, sheet.palette), repeat)
+	width, height = sheet.spriteSize
+	planes = [indexes[frame.y_offset:frame.y_offset+height, frame.x_offset:frame.x_offset+width] for frame in sheet.frames]
+	stages["pack"], packed = timed(lambda: sprites.pack_4bpp(planes), repeat)
+	def write():
+		with open(sheet.dataFilename(), "wb") as fileOut:
+			fileOut.write(bytes(b'\x00\x00') + packed)
+	stages["write"], _ = timed(write, repeat)
+	return {"stages": stages, "pixels": int(pixels.shape[0] * pixels.shape[1]), "bytes": len(packed) + 2}
+
+#Runs a tool as its own process, like make does
+def bench_tool(args, cwd, repeat):
+	def run():
+		subprocess.run([sys.executable] + args, cwd=cwd, check=True, stdout=subprocess.DEVNULL)
+	elapsed, _ = timed(run, repeat)
+	return {"stages": {"total": elapsed}}
+
+#Copies what the build tools read into a scratch directory
+def copy_repo_assets(directory):
+	for name in ["levels.cfg", "sprite.cfg"]:
+		shutil.copy(os.path.join(REPO_DIR, name), directory)
+	for name in ["tilemaps", "images"]:
+		shutil.copytree(os.path.join(REPO_DIR, name), os.path.join(directory, name))
+
+def run_benchmarks(directory, quick, repeat):
+	workloads = []
+	#The tools read and write relative to the working directory
+	os.chdir(directory)
+
+	for name, width, height, layers, entities in (QUICK_MAPS if quick else MAPS):
+		print("map %s" % name)
+		filename = synthetic.make_map(directory, name, width, height, layers, entities)
+		result = bench_map(filename, repeat)
+		result.update({"name": name, "kind": "map", "width": width, "height": height, "layers": layers, "entities": entities})
+		workloads.append(result)
+
+	for name, frames, width, height, colors in (QUICK_SHEETS if quick else SHEETS):
+		print("sheet %s" % name)
+		synthetic.make_sheet(directory, name, frames, width, height, colors)
+		result = bench_sheet(name, 0, repeat)
+		result.update({"name": name, "kind": "sheet", "frames": frames, "width": width, "height": height, "colors": colors})
+		workloads.append(result)
+
+	#Real assets, converted from scratch every time
+	repo = os.path.join(directory, "repo")
+	os.makedirs(repo)
+	copy_repo_assets(repo)
+	for name, args in [
+		("buildlevels", [os.path.join(TOOLS_DIR, "buildlevels.py"), "-force"]),
+		("buildsprites", [os.path.join(TOOLS_DIR, "buildsprites.py"), "-force"]),
+		("spritesheetparserpalette", [os.path.join(TOOLS_DIR, "spritesheetparserpalette.py"), "-s", "images/player.spritesheet", "player"]),
+	]:
+		print("repo %s" % name)
+		result = bench_tool(args, repo, repeat)
+		result.update({"name": "repo-" + name, "kind": "tool"})
+		workloads.append(result)
+	return workloads
+
+#Prints each stage next to the same stage of an earlier run
+def compare(results, previous):
+	old = {workload["name"]: workload for workload in previous["workloads"]}
+	for workload in results["workloads"]:
+		for stage, elapsed in workload["stages"].items():
+			line = "%-30s %-9s %9.2f ms" % (workload["name"], stage, elapsed * 1000)
+			if(workload["name"] in old and stage in old[workload["name"]]["stages"]):
+				before = old[workload["name"]]["stages"][stage]
+				line += "  was %9.2f ms  x%.2f" % (before * 1000, elapsed / before if before > 0 else 0)
+			print(line)
+
+parser = argparse.ArgumentParser(formatter_class=argparse.RawTextHelpFormatter,
+	description='Times the asset pipeline stages on synthetic and real assets.\n\n'
+	'Examples:\n\n'
+	'bench.py -output bench.json\n'
+	'bench.py -quick -compare bench.json\n')
+parser.add_argument('-output', default='bench.json', help='where to write the JSON results, default: bench.json')
+parser.add_argument('-repeat', type=int, default=3, help='runs per stage, the best one is kept, default: 3')
+parser.add_argument('-quick', action='store_true', help='only the small synthetic workloads')
+parser.add_argument('-compare', help='an earlier results file to compare against')
+parser.add_argument('-keep', action='store_true', help='keep the scratch directory with the generated inputs')
+args = parser.parse_args()
+
+output = os.path.abspath(args.output)
+previous = None
+if(args.compare):
+	with open(args.compare, "r") as fileIn:
+		previous = json.load(fileIn)
+
+directory = tempfile.mkdtemp(prefix="x16bench-")
+try:
+	workloads = run_benchmarks(directory, args.quick, args.repeat)
+finally:
+	os.chdir(REPO_DIR)
+	if(args.keep):
+		print("inputs kept in %s" % directory)
+	else:
+		shutil.rmtree(directory, ignore_errors=True)
+
+results = {
+	"date": datetime.datetime.now().isoformat(timespec="seconds"),
+	"python": platform.python_version(),
+	"numpy": np.__version__,
+	"pillow": PIL.__version__,
+	"platform": platform.platform(),
+	"cpus": os.cpu_count(),
+	"repeat": args.repeat,
+	"workloads": workloads,
+}
+with open(output, "w") as fileOut:
+	json.dump(results, fileOut, indent=1)
+
+compare(results, previous or {"workloads": []})
+print("results written to %s" % output)
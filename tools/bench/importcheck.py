@@ -0,0 +1,100 @@
+#!/usr/bin/python3
+
+# Cold start check for the command line tools.  Runs each tool's -h, and
+# buildlevels.py / buildsprites.py once more when everything is up to date,
+# under python -X importtime.  It fails when one of them imports a heavy
+# module it does not need or its imports take longer than the budget.
+#
+#	python3 tools/bench/importcheck.py
+#	python3 tools/bench/importcheck.py -budget 80 -verbose
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+TOOLS_DIR = os.path.dirname(BENCH_DIR)
+REPO_DIR = os.path.dirname(TOOLS_DIR)
+
+#Only needed once a map or sheet has to be converted
+HEAVY = ["numpy", "PIL", "concurrent.futures", "cProfile"]
+
+#(name, arguments); the no-op runs happen in a copy of the assets after a first build
+HELP_RUNS = [
+	("buildlevels -h", ["buildlevels.py", "-h"]),
+	("buildsprites -h", ["buildsprites.py", "-h"]),
+	("x16pack -h", ["x16pack.py", "-h"]),
+	("assetd -h", ["assetd.py", "-h"]),
+	("tilemapper -h", ["tilemapper.py", "-h"]),
+	("png2sprite -h", ["png2sprite.py", "-h"]),
+	("spritesheetparser -h", ["spritesheetparser.py", "-h"]),
+	("spritesheetparserpalette -h", ["spritesheetparserpalette.py", "-h"]),
+	("bin2asm -h", ["bin2asm.py", "-h"]),
+]
+NOOP_RUNS = [
+	("buildlevels up to date", ["buildlevels.py"]),
+	("buildsprites up to date", ["buildsprites.py"]),
+]
+
+#Runs a tool under -X importtime and returns {module: (self us, cumulative us)}
+# and the total of the top level imports in microseconds
+def import_times(args, cwd):
+	result = subprocess.run([sys.executable, "-X", "importtime", os.path.join(TOOLS_DIR, args[0])] + args[1:],
+		cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+	modules = {}
+	total = 0
+	for line in result.stderr.splitlines():
+		if(not line.startswith("import time:") or "cumulative" in line):
+			continue
+		selfTime, cumulative, name = line[len("import time:"):].split("|")
+		modules[name.strip()] = (int(selfTime), int(cumulative))
+		if(not name[1:].startswith(" ")):
+			total += int(cumulative)
+	return modules, total
+
+#Best of repeat runs, so the first run's .pyc writes do not count
+def check(name, args, cwd, budget, repeat, verbose):
+	best = None
+	for i in range(repeat):
+		modules, total = import_times(args, cwd)
+		if(best is None or total < best[1]):
+			best = (modules, total)
+	modules, total = best
+	heavy = [module for module in HEAVY if module in modules]
+	ok = len(heavy) == 0 and total <= budget * 1000
+	print("%-28s %8.1f ms  %s%s" % (name, total / 1000, "ok" if ok else "FAIL", "  imports " + ", ".join(heavy) if heavy else ""))
+	if(verbose):
+		for module, (selfTime, cumulative) in sorted(modules.items(), key=lambda item: -item[1][1])[:10]:
+			print("    %-40s %8.1f ms" % (module, cumulative / 1000))
+	return ok
+
+parser = argparse.ArgumentParser(formatter_class=argparse.RawTextHelpFormatter,
+	description='Checks that the tools start without loading NumPy, Pillow and friends and within a time budget.\n\n'
+	'Examples:\n\n'
+	'importcheck.py\n'
+	'importcheck.py -budget 80 -verbose\n')
+parser.add_argument('-budget', type=float, default=100, help='largest import time per run in ms, default: 100')
+parser.add_argument('-repeat', type=int, default=3, help='runs per tool, the fastest one counts, default: 3')
+parser.add_argument('-verbose', action='store_true', help='list the slowest imports of each run')
+args = parser.parse_args()
+
+ok = True
+for name, toolArgs in HELP_RUNS:
+	ok = check(name, toolArgs, REPO_DIR, args.budget, args.repeat, args.verbose) and ok
+
+directory = tempfile.mkdtemp(prefix="x16imports-")
+try:
+	for filename in ["levels.cfg", "sprite.cfg"]:
+		shutil.copy(os.path.join(REPO_DIR, filename), directory)
+	for filename in ["tilemaps", "images"]:
+		shutil.copytree(os.path.join(REPO_DIR, filename), os.path.join(directory, filename))
+	for name, toolArgs in NOOP_RUNS:
+		subprocess.run([sys.executable, os.path.join(TOOLS_DIR, toolArgs[0])] + toolArgs[1:], cwd=directory, stdout=subprocess.DEVNULL, check=True)
+		ok = check(name, toolArgs, directory, args.budget, args.repeat, args.verbose) and ok
+finally:
+	shutil.rmtree(directory, ignore_errors=True)
+
+sys.exit(0 if ok else 1)
@@ -0,0 +1,133 @@
+#!/usr/bin/python3
+
+# Synthetic inputs for the asset pipeline benchmarks: Tiled maps and sprite
+# sheets of a chosen size, written the same way the real assets in
+# tilemaps/ and images/ are laid out.
+
+import json
+import os
+import numpy as np
+from PIL import Image
+
+#Layer data is stored with a fixed row stride of 256 tiles, like the real maps
+MAP_STRIDE = 256
+
+#Entity pages hold at most 42 six byte records
+ENTITIES_PER_PAGE = 42
+
+#Writes tilemaps/<name>.json and its tileset tilemaps/<name>set.json and
+# returns the map's path.  Layers are numbered 0..layers-2 plus -1 for the
+# background, entities are spread over the layers and their sections.
+def make_map(directory, name, width, height, layers=1, entities=0, tiles=256, seed=0):
+	rng = np.random.default_rng(seed)
+	os.makedirs(os.path.join(directory, "tilemaps"), exist_ok=True)
+	tilesetName = name + "set.json"
+	with open(os.path.join(directory, "tilemaps", tilesetName), "w") as fileOut:
+		json.dump({
+			"name": name + "set",
+			"tilecount": tiles,
+			"tiles": [{"id": i, "type": str(int(rng.integers(0, 16)))} for i in range(tiles)],
+		}, fileOut, indent=1)
+
+	numbers = list(range(layers - 1)) + [-1] if layers > 1 else [0]
+	sections = width // 32
+	jsonLayers = []
+	for layerId, number in enumerate(numbers):
+		data = np.zeros((height, MAP_STRIDE), dtype=np.uint32)
+		gids = rng.integers(1, tiles + 1, size=(height, width), dtype=np.uint32)
+		#Set the flip bits on some tiles
+		gids |= (rng.random((height, width)) < 0.1).astype(np.uint32) << 31
+		gids |= (rng.random((height, width)) < 0.1).astype(np.uint32) << 30
+		data[:, :width] = gids
+		jsonLayers.append({
+			"data": data.reshape(-1).tolist(),
+			"height": height,
+			"id": layerId + 1,
+			"name": "map%d" % number,
+			"properties": [
+				{"name": "MapNumber", "type": "int", "value": number},
+				{"name": "RealHeight", "type": "int", "value": height},
+				{"name": "RealWidth", "type": "int", "value": width},
+			],
+			"type": "tilelayer",
+			"width": MAP_STRIDE,
+			"x": 0,
+			"y": 0,
+		})
+
+	#Round robin over layers and sections so no entity page overflows
+	count = min(entities, len(numbers) * sections * ENTITIES_PER_PAGE)
+	objects = {number: [] for number in numbers}
+	for i in range(count):
+		number = numbers[i % len(numbers)]
+		section = (i // len(numbers)) % sections
+		objects[number].append({
+			"id": i + 1,
+			"type": str(int(rng.integers(1, 32))),
+			"x": float(section * 512 + rng.integers(0, 512)),
+			"y": float(rng.integers(0, height * 16)),
+		})
+	for number in numbers:
+		jsonLayers.append({
+			"id": len(jsonLayers) + 1,
+			"name": "objects%d" % number,
+			"objects": objects[number],
+			"properties": [{"name": "MapNumber", "type": "int", "value": number}],
+			"type": "objectgroup",
+		})
+
+	filename = os.path.join("tilemaps", name + ".json")
+	with open(os.path.join(directory, filename), "w") as fileOut:
+		json.dump({
+			"height": height,
+			"layers": jsonLayers,
+			"properties": [
+				{"name": "MapName", "type": "string", "value": name},
+				{"name": "startx", "type": "int", "value": 24},
+				{"name": "starty", "type": "int", "value": 416},
+			],
+			"tilesets": [{"firstgid": 1, "source": tilesetName}],
+			"type": "map",
+			"width": MAP_STRIDE,
+		}, fileOut, indent=1)
+	return filename
+
+#Writes images/<name>.png and images/<name>.spritesheet and returns the sheet
+# name.  The frames are laid out in rows of 16, the pixels use
+# random palette colors plus a little noise so the matcher has to work for
+# them, and about a quarter of them are transparent.
+def make_sheet(directory, name, frames, frameWidth, frameHeight, colors=15, tilemode=False, seed=0):
+	rng = np.random.default_rng(seed)
+	os.makedirs(os.path.join(directory, "images"), exist_ok=True)
+	columns = min(frames, 16)
+	rows = (frames + columns - 1) // columns
+	palette = rng.integers(0, 16, size=(colors, 3))
+
+	choice = rng.integers(0, colors, size=(rows * frameHeight, columns * frameWidth))
+	pixels = np.empty(choice.shape + (4,), dtype=np.uint8)
+	noise = rng.integers(0, 16, size=choice.shape + (3,))
+	pixels[..., :3] = np.clip((palette[choice] << 4) + noise, 0, 255)
+	pixels[..., 3] = np.where(rng.random(choice.shape) < 0.25, 0, 255)
+	imageName = os.path.join("images", name + ".png")
+	Image.fromarray(pixels, "RGBA").save(os.path.join(directory, imageName))
+
+	with open(os.path.join(directory, "images", name + ".spritesheet"), "w") as fileOut:
+		fileOut.write("!file\n%s\n\n" % imageName)
+		fileOut.write("!name\n%s\n\n" % name)
+		if(tilemode):
+			fileOut.write("!tile\n\n")
+		fileOut.write("!spritesize\n%d,%d\n\n" % (frameWidth, frameHeight))
+		fileOut.write("!frames\n")
+		if(tilemode):
+			fileOut.write("%d,%d\n" % (columns, rows))
+		else:
+			for i in range(frames):
+				fileOut.write("%d:%d,%d\n" % (i, (i % columns) * frameWidth, (i // columns) * frameHeight))
+		fileOut.write("\n\n!animations\n")
+		if(not tilemode):
+			for i in range(0, frames, 4):
+				fileOut.write("%d:%s:0\n" % (i // 4, ",".join("%d~4" % frame for frame in range(i, min(i + 4, frames)))))
+		fileOut.write("\n!palette\n")
+		for color in palette:
+			fileOut.write("%x,%x,%x\n" % tuple(color))
+	return name
@@ -25,10 +25,8 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 
-import numpy as np
-import math
-import sys
 import argparse
+from x16assets import acme
 
 # parse arguments
 parser = argparse.ArgumentParser(formatter_class=argparse.RawTextHelpFormatter,
@@ -36,17 +34,15 @@ parser = argparse.ArgumentParser(formatter_class=argparse.RawTextHelpFormatter,
 parser.add_argument('name', help='the array name')
 parser.add_argument('input', help='the input file name')
 parser.add_argument('output', help='the output file name')
+parser.add_argument('-skip', type=int, default=0, help='bytes to leave out at the start of the input, e.g. 2 for the load address of a PRG file')
+acme.add_arguments(parser)
 args = parser.parse_args()
 
 # convert data
-data = open(args.input, "rb").read()
+data = open(args.input, "rb").read()[args.skip:]
 with open(args.output, "w") as out:
-    out.write("%s:\n" % args.name)
-    i = 0
-    for b in data:
-        out.write("  !byte $%02x\n" % b)
-        i = i + 1
-        if i == 16:
-            out.write("\n")
-            i = 0
-    out.write("\n")
+    if args.binary:
+        # the input already is the binary, so ACME reads it directly
+        out.write(acme.binary_include(args.name, args.input, len(data), args.skip, "  "))
+    else:
+        out.write(acme.labelled_bytes(args.name, data, args.perline, "  ") + "\n")
@@ -27,10 +27,6 @@
 
 # Converts a PNG image to a C style array to be used as a sprite with Commander X16
 
-from PIL import Image
-import numpy as np
-import math
-import sys
 import argparse
 
 # parse arguments
@@ -60,10 +56,18 @@ default_palette = [
 ]
 default_palette.reverse()
 
+# Pillow and NumPy (through colormatch) only load once the arguments are parsed, so -h is quick
+from PIL import Image
+import numpy as np
+from x16assets import colormatch
+
 # load image
 im = Image.open(args.input)
 p = np.array(im)
 
+# find best palette match, search from top to allow index 16 for black color
+indexes = colormatch.quantize(p, default_palette, range(255, -1, -1))
+
 # convert to sprite data
 with open(args.output, "w") as file:
     if args.f == 'c':
@@ -80,30 +84,8 @@ with open(args.output, "w") as file:
             file.write("%i DATA " % line)
             line = line + 1
         for x in range(im.width):
-            # get pixel color
-            r, g, b, a = p[y][x]
+            best = indexes[y][x]
 
-            # use index 0 for transparent color
-            if a == 0:
-                best = 0
-            else:
-                # find best palette match, start searching from top to allow index 16 for black color
-                d = 1e9
-                best = 0
-                j = 255
-                for entry in default_palette:
-                    rp = ((entry >> 8) & 0xf) << 4
-                    gp = ((entry >> 4) & 0xf) << 4
-                    bp = (entry & 0xf) << 4
-                    dr = r - rp
-                    dg = g - gp
-                    db = b - bp
-                    d0 = dr * dr + dg * dg + db * db
-                    if d0 < d:
-                        best = j
-                        d = d0
-                    j = j - 1
-                
             # write palette index
             if args.f == 'c':
                 file.write("0x%02x," % best)
@@ -2,12 +2,9 @@
 
 # Converts sprite sheet data and png image to a C style array to be used as a sprite with Commander X16
 
-from PIL import Image
 from enum import Enum
-import numpy as np
-import math
-import sys
 import argparse
+from x16assets import acme
 
 
 class Frame:
@@ -47,6 +44,7 @@ parser = argparse.ArgumentParser(formatter_class=argparse.RawTextHelpFormatter,
 parser.add_argument('output', help='the output file name')
 parser.add_argument('-f', default='c', choices=['c','basic','acme'], help='output format: c for C array, basic for BASIC, acme for ACME assembler, default: c')
 parser.add_argument('-s', help='File that contains the spritesheet description')
+acme.add_arguments(parser)
 args = parser.parse_args()
 
 
@@ -126,6 +124,11 @@ with open(args.s, "r") as fileIn:
 				animations.append(Animation(frameList))
 	fileIn.close()
 
+# Pillow and NumPy (through colormatch) only load once the arguments are parsed, so -h is quick
+from PIL import Image
+import numpy as np
+from x16assets import colormatch
+
 # load image
 im = Image.open(filename)
 p = np.array(im)
@@ -167,41 +170,18 @@ if(tilemode==0):
 		fileOut.close()
 
 #data file output
+# find best palette match, search from top to allow index 16 for black color
+indexes = colormatch.quantize(p, default_palette, range(255, -1, -1))
+data = b"".join([indexes[frame.y_offset:frame.y_offset+spriteSize[1], frame.x_offset:frame.x_offset+spriteSize[0]].tobytes() for frame in frames])
+
+#The whole sheet is formatted at once and written with one call
 dataFilename = args.output + "data.inc"
+if(args.binary):
+	binaryFilename = args.output + "data.bin"
+	with open(binaryFilename, "wb") as fileOut:
+		fileOut.write(data)
+	source = acme.binary_include(name, binaryFilename, len(data))
+else:
+	source = acme.labelled_bytes(name, data, args.perline)
 with open(dataFilename, "w") as fileOut:
-	fileOut.write("!to \"%s.O\", cbm\n*=0\n" % name.upper())
-	#write data
-	fileOut.write("%s:\n" % name)
-	for frame in frames:
-		for y in range(frame.y_offset,spriteSize[1]+frame.y_offset):
-			fileOut.write("    !byte ")
-			for x in range(frame.x_offset,frame.x_offset+spriteSize[0]):
-				# get pixel color
-				r, g, b, a = p[y][x]
-
-				# use index 0 for transparent color
-				if a == 0:
-					best = 0
-				else:
-					# find best palette match, start searching from top to allow index 16 for black color
-					d = 1e9
-					best = 0
-					j = 255
-					for entry in default_palette:
-						rp = ((entry >> 8) & 0xf) << 4
-						gp = ((entry >> 4) & 0xf) << 4
-						bp = (entry & 0xf) << 4
-						dr = r - rp
-						dg = g - gp
-						db = b - bp
-						d0 = dr * dr + dg * dg + db * db
-						if d0 < d:
-							best = j
-							d = d0
-						j = j - 1
-				# write palette index
-				fileOut.write("$%02x" % best)
-				if x < frame.x_offset+spriteSize[0]-1:
-					fileOut.write(",")
-			fileOut.write("\n")
-	fileOut.close()
+	fileOut.write("!to \"%s.O\", cbm\n*=0\n" % name.upper() + source)
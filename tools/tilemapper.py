@@ -1,11 +1,10 @@
 #!/usr/bin/python3
 
 import json
-import numpy as np
-from enum import Enum
 import math
-import sys
 import argparse
+from x16assets.binarywriter import BinaryWriter
+from x16assets.tiledmap import encode_tilemap, decode_layer_data
 
 class Entity:
 	def __init__(self, entity_type, x_pos, y_pos):
@@ -24,7 +23,8 @@ class Map:
 				self.height = prop["value"]
 			if(prop["name"]=="RealWidth"):
 				self.width = prop["value"]
-		self.data = jsonData["data"]
+		#Plain arrays, or base64 data (optionally zlib/gzip/zstd compressed) as Tiled exports it
+		self.data = decode_layer_data(jsonData["data"], jsonData.get("encoding"), jsonData.get("compression"))
 		self.entities = {}
 		self.start_pointer = 0
 		for i in range(int(self.width // 32)):
@@ -49,40 +49,25 @@ class Map:
 		# 	print(entity.x_pos)
 
 
-def write_byte(inByte):
-	output_bytes.append(inByte & 0xFF)
-
-def write_word(word):
-	lowByte = word & 0xFF
-	highByte = word >> 8
-	write_byte(lowByte)
-	write_byte(highByte)
-
-def skip_to_address(address):
-	while(len(output_bytes) != address):
-		write_byte(0)
-
-
-def write_map(number):
-	map = maplist[number]
+def write_map(out, map):
 	entities = map.entities
 	#Write each section of entities in the the map to a different
 	# page of memory
 	for section in entities.keys():
 		start_address = 0x0100 *(section+1) + map.start_pointer
 		# map_strings[i] += ("*=$%s\n" % hex(start_address).lstrip("0x"))
-		skip_to_address(start_address)
+		out.skip_to_address(start_address)
 
 
 		for entity in entities[section]:
 			# map_strings[i] += ("!word $%s," % hex(entity.x_pos).lstrip("0x"))
-			write_word(entity.x_pos)
+			out.write_word(entity.x_pos)
 			# map_strings[i] += (" $%s\n" % hex(entity.y_pos).lstrip("0x"))
-			write_word(entity.y_pos)
+			out.write_word(entity.y_pos)
 			# map_strings[i] += ("!byte $%s," % hex(entity.entity_type).lstrip("0x"))
-			write_byte(entity.entity_type)
+			out.write_byte(entity.entity_type)
 			# map_strings[i] += (" $00\n") #unused for now
-			write_byte(0)
+			out.write_byte(0)
 
 		#fill the rest of page with 0
 		# fill_amount = 256-(6*len(entities[section]))
@@ -90,33 +75,8 @@ def write_map(number):
 
 	#The tilemap data starts at address $2000
 	# map_strings[i] += ("*=$%s\n" % hex(current_pointer+0x2000).lstrip("0x"))
-	skip_to_address(map.start_pointer+0x2000)
-	for y in range(map.height):
-		# map_strings[i] += ("\t!byte ")
-		for x in range(map.width):
-			#Maybe not use fixed 256 here
-			tileIndex = y * 256 + x
-			tileValue = map.data[tileIndex] - 1
-			lowByte = tileValue & 0xFF
-			#map_strings[i] += ("%d, " % lowByte)
-			write_byte(lowByte)
-			#do second byte palette offset and highest part of tile number
-			tileNumberHighByte = (tileValue >> 8) & 0x03
-			tileFlippedHorizontally = ((tileValue & 0x80000000) != 0)
-			tileFlippedVertically = ((tileValue & 0x40000000) != 0)
-			#tileFlippedDiagonally = ((tileValue & 0x20000000) != 0) #should not be used #TODO maybe add warning
-			paletteoffsetByte = 0 << 4
-			flipbyte = (int(tileFlippedHorizontally) << 2) | (int(tileFlippedVertically) << 3)
-			highByte = tileNumberHighByte | paletteoffsetByte | flipbyte
-
-			# if(x==map.width-1):
-			# 	map_strings[i] += ("%d" % highByte)
-			# else:
-			# 	map_strings[i] += ("%d, " % highByte)
-
-			write_byte(highByte)
-
-		# map_strings[i] += ("\n")
+	out.skip_to_address(map.start_pointer+0x2000)
+	out.extend(encode_tilemap(map.data, map.width, map.height))
 
 tiles = {}
 background = []
@@ -131,8 +91,6 @@ next_pointer = 0
 
 map_strings = {}
 
-output_bytes = []
-
 
 parser = argparse.ArgumentParser(formatter_class=argparse.RawTextHelpFormatter,
 	description='Converts a tile map description file to a .inc file to include in assembly.\n\n'
@@ -168,9 +126,10 @@ with open(args.input, "r") as read_file:
 
 #Write main map index file
 with open(mapName.upper() + ".MAP", "wb") as fileOut:
+	out = BinaryWriter()
 	# fileOut.write("!to \"%s.O\", cbm\n*=0\n" % mapName.upper())
 	# fileOut.write("!byte %s ; %s maps to load\n" % (len(maplist),len(maplist)))
-	write_byte(len(maplist))
+	out.write_byte(len(maplist))
 	next_pointer = 0x2000
 	#Loop through each map layer.  Treating each layer as an individual map
 	for i in range(len(maplist.keys())):
@@ -196,8 +155,8 @@ with open(mapName.upper() + ".MAP", "wb") as fileOut:
 
 		# fileOut.write("!byte %s ; Width Value\n" % widthValue) #TODO make sure game accounts for both -1s
 		# fileOut.write("!byte %s ; Height Value\n" % heightValue)
-		write_byte(widthValue)
-		write_byte(heightValue)
+		out.write_byte(widthValue)
+		out.write_byte(heightValue)
 		mapsize = map.width * map.height * 2
 		banks =  math.ceil(mapsize / 8192)
 		banks = banks + 1 # account for entity bank
@@ -205,7 +164,7 @@ with open(mapName.upper() + ".MAP", "wb") as fileOut:
 		next_pointer = current_pointer + banks * 0x2000
 		map.start_pointer = current_pointer
 		# fileOut.write("!byte %s ; Next Highram Bank\n" % nextBank)
-		write_byte(nextBank)
+		out.write_byte(nextBank)
 		nextBank += banks
 
 
@@ -225,18 +184,17 @@ with open(mapName.upper() + ".MAP", "wb") as fileOut:
 		# map_strings[i] += ("!word $FF\n")
 
 
-	write_word(startx)
-	write_word(starty)
+	out.write_word(startx)
+	out.write_word(starty)
 
 
 	for i in range(len(maplist.keys())):
 		if((len(maplist.keys()) > 1) and i==len(maplist.keys())-1):
 			i = -1
-		write_map(i)
+		write_map(out, maplist[i])
 		#fileOut.write(map_strings[i])
 
-	fileOut.write(bytes(b'\x00\x00'))
-	fileOut.write(bytes(output_bytes))
+	out.write(fileOut)
 
 
 with open(tilesetfile, "r") as tileset_file:
@@ -0,0 +1,37 @@
+# The asset pipeline as a library.  buildlevels.py, buildsprites.py and
+# assetd.py are thin wrappers around it; other scripts can convert many
+# assets in one process the same way:
+#
+#	import x16assets
+#	config = x16assets.load_level_config("levels.cfg")
+#	result = x16assets.compile_map("tilemaps/l1map.json")
+#	sheet = x16assets.parse_spritesheet("player")
+#
+# Nothing is written unless a build_* function or a result's write() is
+# called.  The modules behind these names are imported on first use, so
+# importing the package costs next to nothing.
+
+import importlib
+
+#name: (module, name in that module)
+_EXPORTS = {
+	"load_level_config": ("levels", "load_level_config"),
+	"compile_map": ("levels", "compile_level"),
+	"build_levels": ("levels", "build_levels"),
+	"parse_spritesheet": ("sprites", "readSpriteSheet"),
+	"quantize": ("sprites", "quantize"),
+	"pack_4bpp": ("sprites", "pack_4bpp"),
+	"build_sprite_index": ("sprites", "buildSpriteIndex"),
+	"build_sprites": ("sprites", "buildSprites"),
+	"BuildCache": ("buildcache", "BuildCache"),
+}
+
+__all__ = sorted(_EXPORTS)
+
+def __getattr__(name):
+	if(name not in _EXPORTS):
+		raise AttributeError("module %r has no attribute %r" % (__name__, name))
+	module, attribute = _EXPORTS[name]
+	value = getattr(importlib.import_module("." + module, __name__), attribute)
+	globals()[name] = value
+	return value
@@ -0,0 +1,38 @@
+# ACME assembler source for blocks of binary data.  Each byte is one lookup
+# in a table of "$xx" strings; a whole block is joined into one string and
+# written with a single call instead of a write per byte.
+
+BYTES_PER_LINE = 32
+MIN_BYTES_PER_LINE = 16
+MAX_BYTES_PER_LINE = 32
+
+HEX = ["$%02x" % value for value in range(256)]
+
+#bytes, a bytearray, a list of ints or a NumPy uint8 array of any shape, as a list of ints
+def _values(data):
+	if(hasattr(data, "tobytes")):
+		data = data.tobytes()
+	return list(data)
+
+#The !byte lines for data, bytes_per_line bytes each
+def byte_lines(data, bytes_per_line=BYTES_PER_LINE, indent="    "):
+	if(bytes_per_line < 1):
+		raise ValueError("bytes_per_line has to be at least 1")
+	text = [HEX[value] for value in _values(data)]
+	prefix = indent + "!byte "
+	return "".join([prefix + ",".join(text[start:start + bytes_per_line]) + "\n" for start in range(0, len(text), bytes_per_line)])
+
+#A label followed by the !byte lines for data
+def labelled_bytes(label, data, bytes_per_line=BYTES_PER_LINE, indent="    "):
+	return "%s:\n" % label + byte_lines(data, bytes_per_line, indent)
+
+#Instead of a listing: a label, a !binary line that pulls size bytes of filename in from
+#offset skip, and <label>_end and <label>_size next to it.  The file is read by ACME, so
+#filename has to be where ACME looks for it, e.g. next to the .inc when it runs in the same directory
+def binary_include(label, filename, size, skip=0, indent="    "):
+	return "%s:\n%s!binary \"%s\",%d,%d\n%s_end:\n%s_size = $%04x\n" % (label, indent, filename, size, skip, label, label, size)
+
+#The -perline and -binary options of the scripts that write !byte listings
+def add_arguments(parser):
+	parser.add_argument('-perline', type=int, default=BYTES_PER_LINE, choices=range(MIN_BYTES_PER_LINE, MAX_BYTES_PER_LINE + 1), metavar='%d-%d' % (MIN_BYTES_PER_LINE, MAX_BYTES_PER_LINE), help='bytes per !byte line, default: %d' % BYTES_PER_LINE)
+	parser.add_argument('-binary', action='store_true', help='pull the data in from the binary file with !binary instead of a !byte listing')
@@ -0,0 +1,118 @@
+#!/usr/bin/python3
+
+# Incremental build support for the asset tools.
+#
+# The manifest remembers, for every target, the content hash of each input
+# and output file it was built from.  A target is up to date when all of
+# those files still exist with the same hashes, so touching a file or
+# running "make clean" does not fool it, and editing one spritesheet or map
+# only rebuilds that asset.
+
+import hashlib
+import importlib.util
+import json
+import os
+
+MANIFEST = os.path.join(".x16cache", "buildcache.json")
+
+class BuildCache:
+	def __init__(self, path=MANIFEST, force=False):
+		self.path = path
+		self.force = force
+		self.hashes = {}
+		self.targets = {}
+		try:
+			with open(path, "r") as manifest:
+				self.targets = json.load(manifest)["targets"]
+		except (OSError, ValueError, KeyError):
+			self.targets = {}
+
+	#Content hash of a file, None if it does not exist.  Hashes are reused
+	# while the file's size and modification time stay the same.
+	def file_hash(self, filename):
+		try:
+			stat = os.stat(filename)
+		except OSError:
+			return None
+		key = (stat.st_mtime_ns, stat.st_size)
+		cached = self.hashes.get(filename)
+		if(cached is not None and cached[0] == key):
+			return cached[1]
+		with open(filename, "rb") as fileIn:
+			digest = hashlib.sha1(fileIn.read()).hexdigest()
+		self.hashes[filename] = (key, digest)
+		return digest
+
+	#options are the tool settings that change the outputs, e.g. a codec.
+	# They have to match the ones the target was recorded with.
+	def up_to_date(self, target, options=None):
+		if(self.force or target not in self.targets):
+			return False
+		entry = self.targets[target]
+		if(entry.get("options") != options):
+			return False
+		for filename, digest in list(entry["inputs"].items()) + list(entry["outputs"].items()):
+			if(self.file_hash(filename) != digest):
+				return False
+		return True
+
+	#The files a target was last built from, e.g. to find its outputs
+	def outputs(self, target):
+		return list(self.targets.get(target, {}).get("outputs", {}).keys())
+
+	#Facts learned while building a target, e.g. a map's tileset, so an up to
+	# date target does not have to be read again for them
+	def info(self, target):
+		return self.targets.get(target, {}).get("info", {})
+
+	def record(self, target, inputs, outputs, options=None, info=None):
+		self.targets[target] = {
+			"inputs": {filename: self.file_hash(filename) for filename in inputs},
+			"outputs": {filename: self.file_hash(filename) for filename in outputs},
+		}
+		if(options is not None):
+			self.targets[target]["options"] = options
+		if(info is not None):
+			self.targets[target]["info"] = info
+
+	def forget(self, target):
+		self.targets.pop(target, None)
+
+	def save(self):
+		directory = os.path.dirname(self.path)
+		if(directory):
+			os.makedirs(directory, exist_ok=True)
+		temp = self.path + ".tmp"
+		with open(temp, "w") as manifest:
+			json.dump({"targets": self.targets}, manifest, indent=1, sort_keys=True)
+		os.replace(temp, self.path)
+
+#Writes data to filename unless the file already holds exactly that, so
+# index files are only re-emitted when their contents change.  An unchanged
+# file is still touched: make compares its time with the inputs that
+# triggered the rule and would otherwise run the tool again every time.
+# Returns whether the file was written.
+def write_if_changed(filename, data):
+	data = bytes(data)
+	try:
+		with open(filename, "rb") as fileIn:
+			if(fileIn.read() == data):
+				os.utime(filename)
+				return False
+	except OSError:
+		pass
+	with open(filename, "wb") as fileOut:
+		fileOut.write(data)
+	return True
+
+#Source files of the tools themselves, so changing a converter rebuilds its
+# outputs.  Modules can also be given by name, which finds their file without
+# importing them.
+def tool_sources(*modules):
+	files = []
+	for module in modules:
+		if(isinstance(module, str)):
+			files.append(importlib.util.find_spec(module).origin)
+		else:
+			files.append(module.__file__)
+	return sorted(os.path.relpath(filename) for filename in files)
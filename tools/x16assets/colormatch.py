@@ -0,0 +1,117 @@
+#!/usr/bin/python3
+
+# Shared palette matching for the sprite tools.
+#
+# The X16 palette is 12 bit, so every palette entry sits on the 4 bit grid
+# ((entry >> n) & 0xf) << 4.  For each palette a table of the 4096 RGB444
+# buckets is built once: a bucket whose 8 corners all pick the same entry is
+# resolved by a single lookup (the nearest entry regions are convex, so the
+# whole bucket picks it too).  Only pixels in the few buckets that straddle a
+# boundary fall back to the exact nearest search.  The tables are cached on
+# disk keyed by a hash of the palette.
+
+import hashlib
+import os
+import numpy as np
+
+CACHE_DIR = ".x16cache"
+
+#Table value for buckets that need the exact search
+AMBIGUOUS = -1
+
+#Part of the cache key, raise it when the table layout changes
+TABLE_VERSION = 1
+TABLE_SHAPE = (4096,)
+TABLE_DTYPE = np.int16
+
+matchers = {}
+
+class ColorMatcher:
+	# entries are 12 bit palette values in search order and indexes holds the
+	# palette index to output for each of them.  Ties keep the earliest entry.
+	def __init__(self, entries, indexes, cache_dir=CACHE_DIR):
+		entries = np.array(entries, dtype=np.int32)
+		self.indexes = np.array(indexes, dtype=np.uint8)
+		self.colors = np.stack((((entries >> 8) & 0xf) << 4, ((entries >> 4) & 0xf) << 4, (entries & 0xf) << 4), axis=-1)
+		self.hash = hashlib.sha1(b"v%d:" % TABLE_VERSION + entries.tobytes() + self.indexes.tobytes()).hexdigest()
+		self.table = self.load_table(cache_dir)
+
+	#Returns the position in the search order of the nearest entry for an (N,3) array
+	def nearest(self, rgb):
+		d = np.zeros((len(rgb), len(self.colors)), dtype=np.int32)
+		for channel in range(3):
+			diff = rgb[:, channel, np.newaxis] - self.colors[:, channel]
+			d += diff * diff
+		return np.argmin(d, axis=-1)
+
+	def build_table(self):
+		bucket = np.arange(4096)
+		low = np.stack(((bucket >> 8) & 0xf, (bucket >> 4) & 0xf, bucket & 0xf), axis=-1) << 4
+		corners = []
+		for corner in range(8):
+			offset = np.array([(corner >> 2) & 1, (corner >> 1) & 1, corner & 1]) * 15
+			corners.append(self.nearest(low + offset))
+		table = corners[0].astype(TABLE_DTYPE)
+		for corner in corners[1:]:
+			table[corner != corners[0]] = AMBIGUOUS
+		return table
+
+	def valid_table(self, table):
+		return (isinstance(table, np.ndarray) and table.shape == TABLE_SHAPE and table.dtype == TABLE_DTYPE
+			and table.min() >= AMBIGUOUS and table.max() < len(self.colors))
+
+	def load_table(self, cache_dir):
+		if(cache_dir is None):
+			return self.build_table()
+		cache_file = os.path.join(cache_dir, "colormatch-%s.npy" % self.hash)
+		try:
+			table = np.load(cache_file)
+			#A truncated or foreign file is built again instead of giving wrong colors
+			if(self.valid_table(table)):
+				return table
+		except (OSError, ValueError, EOFError):
+			pass
+		table = self.build_table()
+		#Written under a temporary name first, parallel builds may share the cache
+		try:
+			os.makedirs(cache_dir, exist_ok=True)
+			temp = "%s.%d.tmp" % (cache_file, os.getpid())
+			with open(temp, "wb") as fileOut:
+				np.save(fileOut, table)
+			os.replace(temp, cache_file)
+		except OSError:
+			pass #The cache is only an optimization
+		return table
+
+	#Converts an RGBA pixel array into a plane of palette indexes.  Fully
+	# transparent pixels always get index 0.
+	def match(self, pixels):
+		pixels = np.asarray(pixels)
+		rgb = pixels[..., :3].reshape(-1, 3).astype(np.int32)
+		bucket = ((rgb[:, 0] >> 4) << 8) | ((rgb[:, 1] >> 4) << 4) | (rgb[:, 2] >> 4)
+		position = self.table[bucket]
+
+		ambiguous = np.flatnonzero(position == AMBIGUOUS)
+		if(len(ambiguous) > 0):
+			#Search each distinct color only once
+			packed = (rgb[ambiguous, 0] << 16) | (rgb[ambiguous, 1] << 8) | rgb[ambiguous, 2]
+			unique, inverse = np.unique(packed, return_inverse=True)
+			unique_rgb = np.stack(((unique >> 16) & 0xff, (unique >> 8) & 0xff, unique & 0xff), axis=-1)
+			position[ambiguous] = self.nearest(unique_rgb)[inverse.reshape(-1)]
+
+		best = self.indexes[position].reshape(pixels.shape[:-1])
+		# use index 0 for transparent color
+		best[pixels[..., 3] == 0] = 0
+		return best
+
+#Returns the matcher for a palette, building or loading its table only once per process
+def get_matcher(entries, indexes):
+	key = (tuple(entries), tuple(indexes))
+	if(key not in matchers):
+		matchers[key] = ColorMatcher(entries, indexes)
+	return matchers[key]
+
+def quantize(pixels, entries, indexes):
+	if(len(entries) == 0):
+		return np.zeros(np.shape(pixels)[:-1], dtype=np.uint8)
+	return get_matcher(entries, indexes).match(pixels)
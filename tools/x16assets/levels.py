@@ -0,0 +1,801 @@
+# Level config, Tiled map and index compilation behind buildlevels.py
+
+import json
+import math
+import os
+import sys
+from functools import partial
+from . import binarywriter
+from . import tiledmap
+from . import x16pack
+from .binarywriter import BinaryWriter
+from .tiledmap import encode_tilemap, decode_layer_data, load_tiled, load_tiled_tilesets, load_tile_remap, tile_remap_filename
+from .buildcache import write_if_changed, tool_sources
+from .stagetimer import stage
+
+
+class  Nav_Entry:
+	def __init__(self, x_pos, y_pos, level, up, down, left, right,
+				up_cond, down_cond, left_cond, right_cond):
+		self.x = int(x_pos)
+		self.y = int(y_pos)
+		if(level.isnumeric()):
+			self.level = int(level)
+		else:
+			self.level = 0xFF
+		if(up.isnumeric()):
+			self.up = int(up)
+		else:
+			self.up = 0xFF
+		if(down.isnumeric()):
+			self.down = int(down)
+		else:
+			self.down = 0xFF
+		if(left.isnumeric()):
+			self.left = int(left)
+		else:
+			self.left = 0xFF
+		if(right.isnumeric()):
+			self.right = int(right)
+		else:
+			self.right = 0xFF
+		if(up_cond.isnumeric()):
+			self.up_cond = int(up_cond)
+		else:
+			self.up_cond = 0xFF
+		if(down_cond.isnumeric()):
+			self.down_cond = int(down_cond)
+		else:
+			self.down_cond = 0xFF
+		if(left_cond.isnumeric()):
+			self.left_cond = int(left_cond)
+		else:
+			self.left_cond = 0xFF
+		if(right_cond.isnumeric()):
+			self.right_cond = int(right_cond)
+		else:
+			self.right_cond = 0xFF
+
+class Level_Entry:
+	def __init__(self, filename, palette):
+		self.filename = filename
+		self.palette = int(palette)
+
+class Entity:
+	def __init__(self, entity_type, x_pos, y_pos):
+		self.entity_type = int(entity_type)
+		self.x_pos = int(x_pos)
+		self.y_pos = int(y_pos)
+
+def get_entity_x_pos(elem):
+	return elem.x_pos
+
+#Entities are kept in 32 tile wide sections, one 256 byte page of six byte
+# records each.  The optional grid also splits the sections into 32 tile
+# high bands, see tools/MAPFORMAT.md.
+ENTITY_SECTION_TILES = 32
+ENTITY_BAND_TILES = 32
+ENTITY_RECORD_SIZE = 6
+ENTITIES_PER_PAGE = 0x100 // ENTITY_RECORD_SIZE
+
+#Page 0 of the entity bank with the entity grid: the number of sections and
+# bands, then for each section its entity count and the index of the first
+# record of every band
+def write_entity_grid(out, map):
+	bands = map.entity_bands()
+	out.write_byte(len(map.entities))
+	out.write_byte(bands)
+	for section in map.entities.keys():
+		entities = map.entities[section]
+		out.write_byte(len(entities))
+		start = 0
+		for band in range(bands):
+			out.write_byte(start)
+			start += sum(1 for entity in entities if map.entity_band(entity) == band)
+
+#The entity table of a layer: page 0 (the grid, if any) and a page per section
+def write_entities(out, map, entity_grid = False):
+	if(entity_grid):
+		out.skip_to_address(map.entity_pointer)
+		write_entity_grid(out, map)
+	entities = map.entities
+	#Write each section of entities in the the map to a different
+	# page of memory
+	for section in entities.keys():
+		start_address = 0x0100 *(section+1) + map.entity_pointer
+		# map_strings[i] += ("*=$%s\n" % hex(start_address).lstrip("0x"))
+		out.skip_to_address(start_address)
+
+		#With the grid the records of a band are kept together
+		if(entity_grid):
+			ordered = sorted(entities[section], key=lambda entity: (map.entity_band(entity), entity.x_pos))
+		else:
+			ordered = entities[section]
+		for entity in ordered:
+			# map_strings[i] += ("!word $%s," % hex(entity.x_pos).lstrip("0x"))
+			out.write_word(entity.x_pos)
+			# map_strings[i] += (" $%s\n" % hex(entity.y_pos).lstrip("0x"))
+			out.write_word(entity.y_pos)
+			# map_strings[i] += ("!byte $%s," % hex(entity.entity_type).lstrip("0x"))
+			out.write_byte(entity.entity_type)
+			# map_strings[i] += (" $00\n") #unused for now
+			out.write_byte(0)
+
+		#fill the rest of page with 0
+		# fill_amount = 256-(6*len(entities[section]))
+		# map_strings[i] += ("!fill $%s\n" % hex(fill_amount).lstrip("0x"))
+
+def write_tiles(out, map, remap = None):
+	#The tilemap data starts at address $2000 of the layer, unless the banks are packed
+	# map_strings[i] += ("*=$%s\n" % hex(current_pointer+0x2000).lstrip("0x"))
+	out.skip_to_address(map.tiles_pointer)
+	with stage("encode", tiles=map.width * map.height):
+		out.extend(encode_tilemap(map.data, map.width, map.height, remap=remap))
+
+def write_map(out, map, remap = None, entity_grid = False):
+	write_entities(out, map, entity_grid)
+	write_tiles(out, map, remap)
+
+BANK_SIZE = 0x2000
+PACKED_BANKS = 0x80
+PAGE_SIZE = 0x100
+PAGES_PER_BANK = BANK_SIZE // PAGE_SIZE
+
+#Places the entity tables and tilemaps of the layers for -packbanks and sets
+# their entity_pointer and tiles_pointer.  Tilemaps of a bank or more get
+# whole banks of their own; the entity tables and small tilemaps are then
+# put first fit, largest first, into the free pages of those banks.  Page 0
+# of bank 0 is the header.  Nothing straddles a bank.
+def allocate_banks(layers):
+	free = [1] #first free page of each bank
+	small = []
+	for map in layers:
+		small.append((map.entity_pages(), map, "entity_pointer"))
+		pages = (map.tile_bytes() + PAGE_SIZE - 1) // PAGE_SIZE
+		if(pages < PAGES_PER_BANK):
+			small.append((pages, map, "tiles_pointer"))
+			continue
+		map.tiles_pointer = len(free) * BANK_SIZE
+		free += [PAGES_PER_BANK] * (pages // PAGES_PER_BANK)
+		if(pages % PAGES_PER_BANK):
+			free.append(pages % PAGES_PER_BANK)
+	for pages, map, attribute in sorted(small, key=lambda item: -item[0]):
+		for bank in range(len(free) + 1):
+			if(bank == len(free)):
+				free.append(0)
+			if(free[bank] + pages <= PAGES_PER_BANK):
+				setattr(map, attribute, bank * BANK_SIZE + free[bank] * PAGE_SIZE)
+				free[bank] += pages
+				break
+
+class Map:
+	def __init__(self, mapNumber, jsonData):
+		self.map_number = int(mapNumber)
+		for prop in jsonData["properties"]:
+			if(prop["name"]=="RealHeight"):
+				self.height = prop["value"]
+			if(prop["name"]=="RealWidth"):
+				self.width = prop["value"]
+		#Plain arrays, or base64 data (optionally zlib/gzip/zstd compressed) as Tiled exports it
+		self.data = decode_layer_data(jsonData["data"], jsonData.get("encoding"), jsonData.get("compression"))
+		self.entities = {}
+		self.entity_pointer = 0
+		self.tiles_pointer = 0
+		for i in range(int(self.width // 32)):
+			self.entities[i] = []
+	def addEntities(self, objectData):
+		for object in objectData["objects"]:
+			type = object["type"]
+			x = object["x"]
+			y = object["y"]
+			newEntity = Entity(type, x, y)
+			#The map is divided into sections of entities that are loaded together
+			section = int((newEntity.x_pos / 16) // ENTITY_SECTION_TILES)
+			if(section not in self.entities or newEntity.y_pos < 0 or newEntity.y_pos >= self.height * 16):
+				raise ValueError("map %d: entity %s at %d,%d is outside the %dx%d tile map" % (self.map_number, object.get("id", "?"), newEntity.x_pos, newEntity.y_pos, self.width, self.height))
+			self.entities[section].append(newEntity)
+		#Reorder based on x coordinate
+		# print("before:")
+		# for entity in self.entities:
+		# 	print(entity.x_pos)
+		for section in self.entities.keys():
+			self.entities[section].sort(key=get_entity_x_pos)
+		# print("after:")
+		# for entity in self.entities:
+		# 	print(entity.x_pos)
+		#A full page would run into the next section's page
+		for section, entities in self.entities.items():
+			if(len(entities) > ENTITIES_PER_PAGE):
+				first = section * ENTITY_SECTION_TILES
+				raise ValueError("map %d: tiles %d-%d have %d entities, a section holds at most %d" % (self.map_number, first, first + ENTITY_SECTION_TILES - 1, len(entities), ENTITIES_PER_PAGE))
+
+	def tile_bytes(self):
+		return self.width * self.height * 2
+
+	#Page 0 and a page per section
+	def entity_pages(self):
+		return len(self.entities) + 1
+
+	def entity_bands(self):
+		return (self.height + ENTITY_BAND_TILES - 1) // ENTITY_BAND_TILES
+
+	def entity_band(self, entity):
+		return (entity.y_pos // 16) // ENTITY_BAND_TILES
+
+#The PALETTE, LEVELS and NAV sections of a level config, by number
+class Level_Config:
+	def __init__(self):
+		self.palettes = {}
+		self.levels = {}
+		self.nav = {}
+
+	#The Tiled maps of the levels, then the map map
+	def level_filenames(self):
+		return ["tilemaps/" + self.levels[i].filename for i in range(len(self.levels))] + ["tilemaps/mapmap.json"]
+
+
+def process_palette(lines_in, palettes):
+	#print(lines_in)
+	i = 0
+	ilen = len(lines_in)
+	while(i < ilen):
+		x = lines_in[i]
+		x = x.strip(' \n:')
+		num = int(x)
+		i+=1
+		x = lines_in[i]
+		x = x.strip(' \n:\t')
+		filename = x
+		palettes[num] = filename
+		i+=1
+	#print(palettes)
+
+
+def process_levels(lines_in, levels):
+	#print(lines_in)
+	i = 0
+	ilen = len(lines_in)
+	while(i < ilen):
+		x = lines_in[i]
+		x = x.strip(' \n:')
+		num = int(x)
+		filename = ''
+		palette = ''
+		while(1):
+			i+=1
+			if(i >= ilen):
+				break
+			x = lines_in[i]
+			if(x[0].strip(':').isnumeric()):
+				break
+			x = x.strip(' \n\t')
+			x = x.split(':')
+			if(x[0] == "file"):
+				filename = x[1]
+			if(x[0] == "palette"):
+				palette = x[1]
+		levels[num] = Level_Entry(filename, palette)
+	#print(levels)
+
+def process_nav(lines_in, nav):
+	#print(lines_in)
+	i = 0
+	ilen = len(lines_in)
+	while(i < ilen):
+		x = lines_in[i]
+		x = x.strip('\n:')
+		num = int(x)
+		x_pos = ''
+		y_pos = ''
+		level = ''
+		up = ''
+		down = ''
+		left = ''
+		right = ''
+		up_cond = ''
+		down_cond = ''
+		left_cond = ''
+		right_cond = ''
+		while(1):
+			i+=1
+			if(i >= ilen):
+				break
+			x = lines_in[i]
+			if(x[0].strip(':').isnumeric()):
+				break
+			x = x.strip(' \n\t')
+			x = x.split(':')
+			if(x[0] == "X"):
+				x_pos = x[1]
+			elif(x[0] == "Y"):
+				y_pos = x[1]
+			elif(x[0] == "LEVEL"):
+				level = x[1]
+			elif(x[0] == "UP"):
+				x = x[1].split(',')
+				up = x[0]
+				if(len(x) > 1):
+					up_cond = x[1]
+			elif(x[0] == "DOWN"):
+				x = x[1].split(',')
+				down = x[0]
+				if(len(x) > 1):
+					down_cond = x[1]
+			elif(x[0] == "LEFT"):
+				x = x[1].split(',')
+				left= x[0]
+				if(len(x) > 1):
+					left_cond = x[1]
+			elif(x[0] == "RIGHT"):
+				x = x[1].split(',')
+				right = x[0]
+				if(len(x) > 1):
+					right_cond = x[1]
+		nav[num] = Nav_Entry(x_pos, y_pos, level, up, down, left, right, up_cond, down_cond, left_cond, right_cond)
+
+
+#Everything one Tiled map compiles to.  map_name comes from the map's MapName
+# property and names the .MAP and .VAR files; tileset_name is the .TSH that
+# LEVEL.IND names for it (None if the tileset names no image).
+class Level_Result:
+	def __init__(self, filename, map_name, tilesetfile, map_bytes, var_bytes, tiles=0, remapfile=None, tileset_name=None):
+		self.filename = filename
+		self.map_name = map_name
+		self.tilesetfile = tilesetfile
+		self.tileset_name = tileset_name
+		self.map_bytes = map_bytes
+		self.var_bytes = var_bytes
+		self.tiles = tiles
+		self.remapfile = remapfile
+
+	def map_filename(self):
+		return self.map_name.upper() + ".MAP"
+
+	def var_filename(self):
+		return (self.map_name + ".var").upper()
+
+	def write(self):
+		with open(self.map_filename(), "wb") as fileOut:
+			fileOut.write(self.map_bytes)
+		with open(self.var_filename(), "wb") as fileOut:
+			fileOut.write(self.var_bytes)
+
+#The remap file of the tileset's image, whether or not it exists, None if
+# the tileset does not name an image
+def tileset_remap_filename(tilesetfile, tileset):
+	if("image" not in tileset):
+		return None
+	image = os.path.normpath(os.path.join(os.path.dirname(tilesetfile), tileset["image"]))
+	return tile_remap_filename(image)
+
+#The tile types in .VAR order.  With a remap each unique tile gets the type
+# of the tiles merged into it, which have to agree.
+def tile_types(tilesetfile, tileset, remap = None):
+	types = []
+	for tile in tileset["tiles"]:
+		type = int(tile["type"])
+		type = type & 0xFF
+		types.append(type)
+	if(remap is None):
+		return types
+
+	merged = {}
+	for i in range(min(len(types), len(remap))):
+		unique = int(remap[i][0])
+		if(unique not in merged):
+			merged[unique] = i
+		elif(types[merged[unique]] != types[i]):
+			raise ValueError("%s: tiles %d and %d look the same and are merged by !dedup, but have types %d and %d" % (tilesetfile, merged[unique], i, types[merged[unique]], types[i]))
+	count = max(merged.keys()) + 1 if len(merged) > 0 else 0
+	return [types[merged[unique]] if unique in merged else 0 for unique in range(count)]
+
+#Compiles one Tiled map and its tileset into the contents of the .MAP and
+# .VAR files.  Nothing is written and no global state is used, so maps can be
+# compiled in any order or in parallel.  A codec other than CODEC_NONE packs
+# the .MAP into the container described in tools/MAPFORMAT.md, entity_grid
+# adds the entity grid to each entity bank and pack_banks shares banks
+# between the layers' entity tables and tilemaps.
+def compile_level(filename, codec = x16pack.CODEC_NONE, entity_grid = False, pack_banks = False):
+	mapName = ""
+	startx = 0
+	starty = 0
+	maplist = {}
+	nextBank = 1
+	#READ json file from Tiled, the layer data comes back as uint32 arrays
+	with stage("json load"):
+		data = load_tiled(filename)
+	#set up maps
+	for prop in data["properties"]:
+		if(prop["name"]=="MapName"):
+			mapName = prop["value"]
+		if(prop["name"]=="startx"):
+			startx = prop["value"]
+		if(prop["name"]=="starty"):
+			starty = prop["value"]
+
+	tilesetfile = "tilemaps/" + data["tilesets"][0]["source"] #TODO loop through props
+
+	for layer in data["layers"]:
+		if(layer["type"] == "tilelayer"):
+			maplist[layer["properties"][0]["value"]] = Map(layer["properties"][0]["value"], layer)
+	#attach objects
+	for layer in data["layers"]:
+		if(layer["type"] == "objectgroup"):
+			maplist[layer["properties"][0]["value"]].addEntities(layer)
+
+	#The layers in file order, the last one is map -1
+	layers = []
+	for i in range(len(maplist.keys())):
+		if((len(maplist.keys()) > 1) and i==len(maplist.keys())-1):
+			i = -1
+		layers.append(maplist[i])
+	if(pack_banks):
+		allocate_banks(layers)
+
+	#Main map file
+	out = BinaryWriter()
+	# fileOut.write("!to \"%s.O\", cbm\n*=0\n" % mapName.upper())
+	# fileOut.write("!byte %s ; %s maps to load\n" % (len(maplist),len(maplist)))
+	#Bit 7 of the count marks the packed bank header
+	out.write_byte(len(maplist) | (PACKED_BANKS if pack_banks else 0))
+	next_pointer = 0x2000
+	#Loop through each map layer.  Treating each layer as an individual map
+	for map in layers:
+		#fileOut.write("tilemap%d:\n" % i)
+		heightValue = 0
+		if(map.height == 64):
+			heightValue = 1
+		elif(map.height == 128):
+			heightValue = 2
+		elif(map.height == 256):
+			heightValue = 3
+		widthValue = 0
+		if(map.width == 64):
+			widthValue = 1
+		elif(map.width == 128):
+			widthValue = 2
+		elif(map.width == 256):
+			widthValue = 3
+
+		# fileOut.write("!byte %s ; Width Value\n" % widthValue) #TODO make sure game accounts for both -1s
+		# fileOut.write("!byte %s ; Height Value\n" % heightValue)
+		out.write_byte(widthValue)
+		out.write_byte(heightValue)
+		if(pack_banks):
+			#Bank and page of the entity table, then of the tilemap
+			for pointer in (map.entity_pointer, map.tiles_pointer):
+				out.write_byte(pointer // BANK_SIZE)
+				out.write_byte((pointer % BANK_SIZE) // PAGE_SIZE)
+			continue
+		mapsize = map.width * map.height * 2
+		banks =  math.ceil(mapsize / 8192)
+		banks = banks + 1 # account for entity bank
+		current_pointer = next_pointer
+		next_pointer = current_pointer + banks * 0x2000
+		map.entity_pointer = current_pointer
+		map.tiles_pointer = current_pointer + 0x2000
+		# fileOut.write("!byte %s ; Next Highram Bank\n" % nextBank)
+		out.write_byte(nextBank)
+		nextBank += banks
+
+	out.write_word(startx)
+	out.write_word(starty)
+
+	#A tileset whose tile sheet was deduplicated comes with a remap
+	with open(tilesetfile, "r") as tileset_file:
+		tileset = json.load(tileset_file)
+	remapfile = tileset_remap_filename(tilesetfile, tileset)
+	remap = load_tile_remap(remapfile) if remapfile is not None else None
+
+	#In address order, packed banks can interleave the layers
+	pieces = []
+	for map in layers:
+		pieces.append((map.entity_pointer, partial(write_entities, out, map, entity_grid)))
+		pieces.append((map.tiles_pointer, partial(write_tiles, out, map, remap)))
+	for pointer, write in sorted(pieces, key=lambda piece: piece[0]):
+		write()
+	#Empty entity pages at the end still have to be loaded to clear the RAM
+	end = max(max(map.entity_pointer + map.entity_pages() * PAGE_SIZE, map.tiles_pointer + map.tile_bytes()) for map in layers)
+	out.skip_to_address(max(end, len(out)))
+	map_bytes = bytes(b'\x00\x00') + out.getvalue()
+	if(codec != x16pack.CODEC_NONE):
+		with stage("compress"):
+			map_bytes = x16pack.pack_file_data(map_bytes, codec)
+
+	#Tile types from the tileset
+	out = BinaryWriter()
+	#fileOut.write("!to \"%s\", cbm\n*=0\n" % varsassembledfilename)
+	for type in tile_types(tilesetfile, tileset, remap):
+		out.write_byte(type)
+	var_bytes = bytes(b'\x00\x00') + out.getvalue()
+
+	tiles = sum(map.width * map.height for map in maplist.values())
+	tileset_name = tileset_image_name(tileset) if "image" in tileset else None
+	return Level_Result(filename, mapName, tilesetfile, map_bytes, var_bytes, tiles, remapfile, tileset_name)
+
+#Compiles the maps and writes their .MAP and .VAR files.  With a build cache
+# a map is skipped when it, its tileset and the tools are unchanged and both
+# outputs are still there.  With more than one job the maps are compiled in a
+# process pool; the files and the cache are written here in config order.
+# Returns the results of the maps that were compiled.
+def compile_levels(filenames, cache = None, jobs = 1, codec = x16pack.CODEC_NONE, entity_grid = False, pack_banks = False):
+	#The options are kept with each map so switching them rebuilds it
+	options = {}
+	if(codec != x16pack.CODEC_NONE):
+		options["codec"] = codec
+	if(entity_grid):
+		options["entity_grid"] = True
+	if(pack_banks):
+		options["pack_banks"] = True
+	options = options or None
+	stale = [filename for filename in filenames if cache is None or not cache.up_to_date(filename, options)]
+	if(jobs > 1 and len(stale) > 1):
+		#The per level stages run in the workers and are not timed one by one
+		with stage("levels in %d workers" % min(jobs, len(stale))):
+			from concurrent.futures import ProcessPoolExecutor
+			with ProcessPoolExecutor(max_workers=min(jobs, len(stale))) as pool:
+				results = list(pool.map(partial(compile_level, codec=codec, entity_grid=entity_grid, pack_banks=pack_banks), stale))
+	else:
+		results = []
+		for filename in stale:
+			with stage("level " + filename) as timing:
+				results.append(compile_level(filename, codec, entity_grid, pack_banks))
+				timing.tiles = results[-1].tiles
+
+	for result in results:
+		with stage("write"):
+			result.write()
+		if(cache is not None):
+			#The remap is an input even while it does not exist, so adding one rebuilds the map
+			inputs = [result.filename, result.tilesetfile] + ([result.remapfile] if result.remapfile is not None else [])
+			#LEVEL.IND needs the tileset of every map, compiled this time or not
+			info = {"tileset": result.tileset_name} if result.tileset_name is not None else None
+			cache.record(result.filename, inputs + TOOL_SOURCES, [result.map_filename(), result.var_filename()], options, info)
+	return results
+
+#Reads the PALETTE, LEVELS and NAV sections of the level config
+def load_level_config(filename):
+	config = Level_Config()
+	with open(filename, "r") as read_file:
+		f1 = read_file.readlines()
+		i = 0
+		ilen = len(f1)
+		while(i < ilen):
+			x = f1[i]
+			x = x.strip('\n')
+			if(x == 'PALETTE:'):
+				lines_in = []
+				while(1):
+					i+=1
+					if(i >= ilen):
+						break
+					x= f1[i]
+					x = x.strip('\n:')
+					if(len(x)==0):
+						break
+					else:
+						lines_in.append(x)
+				process_palette(lines_in, config.palettes)
+			elif(x == 'LEVELS:'):
+				lines_in = []
+				while(1):
+					i+=1
+					if(i >= ilen):
+						break
+					x= f1[i]
+					x = x.strip('\n:')
+					if(len(x)==0):
+						break
+					else:
+						lines_in.append(x)
+				process_levels(lines_in, config.levels)
+			elif(x == 'NAV:'):
+				lines_in = []
+				while(1):
+					i+=1
+					if(i >= ilen):
+						break
+					x= f1[i]
+					x = x.strip('\n:')
+					if(len(x)==0):
+						break
+					else:
+						lines_in.append(x)
+				process_nav(lines_in, config.nav)
+			else:
+				i+=1
+	return config
+
+#MAP.NAV: one 11 byte entry per map screen
+def build_map_nav(config):
+	out = BinaryWriter()
+	for i in range(len(config.nav)):
+		entry = config.nav[i]
+		out.write_byte(entry.x)
+		out.write_byte(entry.y)
+		out.write_byte(entry.level)
+		out.write_byte(entry.up)
+		out.write_byte(entry.down)
+		out.write_byte(entry.left)
+		out.write_byte(entry.right)
+		out.write_byte(entry.up_cond)
+		out.write_byte(entry.down_cond)
+		out.write_byte(entry.left_cond)
+		out.write_byte(entry.right_cond)
+
+	return bytes(b'\x00\x00') + out.getvalue()
+
+#Interned PETSCII strings: each name is written once, at its first use, and
+# every later use gets the same pointer
+class String_Table:
+	def __init__(self, out):
+		self.out = out
+		self.offsets = {}
+
+	def intern(self, name):
+		if(name not in self.offsets):
+			self.offsets[name] = len(self.out)+1
+			self.out.write_string(name)
+		return self.offsets[name]
+
+#The tile sheet a tileset is drawn from, named after its image
+def tileset_image_name(tileset):
+	return os.path.splitext(os.path.basename(tileset["image"]))[0].lower() + ".tsh"
+
+#The tile sheet a map is drawn with, for maps whose name the build cache does
+# not know.  Only the map's "tilesets" array is parsed, not its layers.
+def map_tileset_name(filename):
+	tilesetfile = "tilemaps/" + load_tiled_tilesets(filename)[0]["source"]
+	with open(tilesetfile, "r") as tileset_file:
+		tileset = json.load(tileset_file)
+	if("image" not in tileset):
+		raise ValueError("%s: the tileset %s names no image, so its .TSH is unknown" % (filename, tilesetfile))
+	return tileset_image_name(tileset)
+
+#LEVEL.IND: pointers to the level and map map tables, the palette and tileset
+# names, then each level's table and file names.  Every name is stored once.
+# After MAP.NAV comes the asset table, see tools/MAPFORMAT.md.
+# tileset_names, in the order of config.level_filenames(), are the .TSH names
+# already known, e.g. from the build cache; the others are read from the maps.
+def build_level_index(config, tileset_names=None):
+	palettes = config.palettes
+	levels = config.levels
+	#The levels, then the map map, which always uses palette 1
+	tables = [(levels[i].filename.strip(' \n\t'), levels[i].palette) for i in range(len(levels))] + [("mapmap.json", 1)]
+	tileset_names = tileset_names or [None] * len(tables)
+	tilesets = [tileset_names[i] or map_tileset_name("tilemaps/" + filename) for i, (filename, palette) in enumerate(tables)]
+
+	out = BinaryWriter()
+	strings = String_Table(out)
+	out.write_word(0) # IS overwritten later with nav file pointer
+	out.write_byte(len(tables))
+	for i in range(len(tables)):
+		out.write_word(0) # overwritten below with the table address, when the table is written
+
+	#write palettes, then tilesets
+	for i in range(len(palettes)):
+		strings.intern(palettes[i])
+	for tileset in tilesets:
+		strings.intern(tileset)
+
+	#write level indexes, the map map last
+	for i, (filename, palette) in enumerate(tables):
+		#assign pointer in index
+		current_output_pointer = len(out)
+		out.patch_word(3+(2*i), current_output_pointer)
+
+		#Write table
+		# level1_map_files:
+		# 	!word testtilesname
+		# 	!word level1filename
+		# 	!word level1varsname
+		# 	!word testpalettename
+		#
+		# 	!byte 6
+		# level1filename:
+		# 	!pet "l1.map"
+		#
+		# 	!byte 6
+		# level1varsname:
+		# 	!pet "l1va.o"
+
+		out.write_word(strings.intern(tilesets[i]))
+		thisfilename_pointer = out.reserve_word()
+		thisvarsname_pointer = out.reserve_word()
+		out.write_word(strings.intern(palettes[palette]))
+
+		mapfilename = filename.replace('map.json','.map').upper()
+		out.patch_word(thisfilename_pointer, strings.intern(mapfilename))
+
+		varfilename = filename.replace('map.json','.var').upper()
+		out.patch_word(thisvarsname_pointer, strings.intern(varfilename))
+
+	out.patch_word(0, strings.intern("MAP.NAV"))
+
+	#Asset table: the unique tilesets and palettes, each table's indexes into
+	# them and the tables grouped by the assets they share
+	unique_tilesets = list(dict.fromkeys(tilesets))
+	unique_palettes = list(dict.fromkeys(palette for filename, palette in tables))
+	assets = [(unique_tilesets.index(tilesets[i]), unique_palettes.index(palette)) for i, (filename, palette) in enumerate(tables)]
+	out.write_byte(len(unique_tilesets))
+	for tileset in unique_tilesets:
+		out.write_word(strings.intern(tileset))
+	out.write_byte(len(unique_palettes))
+	for palette in unique_palettes:
+		out.write_word(strings.intern(palettes[palette]))
+	for tileset, palette in assets:
+		out.write_byte(tileset)
+		out.write_byte(palette)
+	groups = {}
+	for i, key in enumerate(assets):
+		groups.setdefault(key, []).append(i)
+	out.write_byte(len(groups))
+	for (tileset, palette), members in groups.items():
+		out.write_byte(tileset)
+		out.write_byte(palette)
+		out.write_byte(len(members))
+		for i in members:
+			out.write_byte(i)
+
+	return bytes(b'\x00\x00') + out.getvalue()
+
+
+#The banks a .MAP file's layers use and the bytes they hold, read back from
+# its header.  data starts after the load address and may be packed.
+def bank_usage(data):
+	if(x16pack.is_packed(data)):
+		data = x16pack.unpack(data)
+	count = data[0] & ~PACKED_BANKS
+	banks = set()
+	payload = 0
+	for i in range(count):
+		if(data[0] & PACKED_BANKS):
+			width, height, entity_bank, entity_page, tiles_bank, tiles_page = data[1+6*i:7+6*i]
+			tiles_start = tiles_bank * BANK_SIZE + tiles_page * PAGE_SIZE
+		else:
+			width, height, entity_bank = data[1+3*i:4+3*i]
+			tiles_start = (entity_bank + 1) * BANK_SIZE
+		tile_bytes = (32 << width) * (32 << height) * 2
+		entity_bytes = ((32 << width) // ENTITY_SECTION_TILES + 1) * PAGE_SIZE
+		banks.add(entity_bank)
+		banks.update(range(tiles_start // BANK_SIZE, (tiles_start + tile_bytes - 1) // BANK_SIZE + 1))
+		payload += tile_bytes + entity_bytes
+	return count, banks, payload
+
+#How full the banks of each map are, e.g. to compare the layouts of -packbanks
+def bank_report(filenames, fileOut=sys.stdout):
+	fileOut.write("%-12s %6s %6s %10s %10s %6s\n" % ("map", "layers", "banks", "bytes", "used", "full"))
+	total_banks = 0
+	total_payload = 0
+	for filename in filenames:
+		with open(filename, "rb") as fileIn:
+			count, banks, payload = bank_usage(fileIn.read()[2:])
+		#Bank 0 holds the header
+		banks.add(0)
+		total_banks += len(banks)
+		total_payload += payload
+		fileOut.write("%-12s %6d %6d %10d %10d %5.1f%%\n" % (filename, count, len(banks), len(banks) * BANK_SIZE, payload, 100.0 * payload / (len(banks) * BANK_SIZE)))
+	if(total_banks > 0):
+		fileOut.write("%-12s %6s %6d %10d %10d %5.1f%%\n" % ("total", "", total_banks, total_banks * BANK_SIZE, total_payload, 100.0 * total_payload / (total_banks * BANK_SIZE)))
+
+#Compiles the maps of a level config that are out of date and writes MAP.NAV
+# and LEVEL.IND if they changed.  config is a Level_Config or the name of the
+# file to load it from.  Returns the results of the compiled maps.
+def build_levels(config, cache, jobs = 1, codec = x16pack.CODEC_NONE, entity_grid = False, pack_banks = False):
+	if(not isinstance(config, Level_Config)):
+		with stage("config parse"):
+			config = load_level_config(config)
+
+	#Compile every level and the map map, then build the indexes
+	results = compile_levels(config.level_filenames(), cache, jobs, codec, entity_grid, pack_banks)
+	cache.save()
+
+	#Write MAP.NAV and LEVEL.IND files, only touched when they changed
+	with stage("index assembly"):
+		write_if_changed('MAP.NAV', build_map_nav(config))
+		tileset_names = [cache.info(filename).get("tileset") for filename in config.level_filenames()]
+		write_if_changed('LEVEL.IND', build_level_index(config, tileset_names))
+	return results
+
+
+TOOL_SOURCES = tool_sources(sys.modules[__name__], binarywriter, tiledmap, x16pack)
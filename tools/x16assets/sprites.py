@@ -0,0 +1,493 @@
+# Sprite sheet conversion behind buildsprites.py
+
+from enum import Enum
+import os
+import sys
+from . import binarywriter
+from . import tiledmap
+from . import x16pack
+from .binarywriter import BinaryWriter
+from .tiledmap import encode_tile_remap, load_tile_remap, tile_remap_filename
+from .buildcache import write_if_changed, tool_sources
+from .stagetimer import stage
+
+
+#CODE FROM SPRITE SHEET PARSER
+
+
+class Frame:
+	def __init__(self, x_offset, y_offset):
+		self.x_offset = x_offset
+		self.y_offset = y_offset
+
+class Animation:
+	def __init__(self, frame_array):
+		self.frame_array = frame_array
+
+class Color:
+	def __init__(self, r, g, b):
+		self.red = r
+		self.green = g
+		self.blue = b
+
+	def hexvalue(self):
+		bp = (self.blue) & 0x0F
+		gp = ((self.green) << 4) & 0xF0
+		rp = ((self.red) << 8) & 0xF00
+		return bp+gp+rp
+
+#Converts an RGBA pixel array (a frame or the whole sheet) into a plane of
+# palette indexes.  Index 0 is reserved for transparent pixels, the other
+# entries are searched in key order so ties keep the lowest key.
+def quantize(pixels, palette):
+	from . import colormatch
+	keys = [key for key in palette.keys() if key != 0]
+	return colormatch.quantize(pixels, [palette[key].hexvalue() for key in keys], keys)
+
+#Packs palette index planes into 4bpp data, two pixels per byte with the left
+# pixel in the high nibble.  A list of frames is packed back to back in one call.
+# An odd last column is dropped, like the original per byte loop did.
+def pack_4bpp(indexes):
+	import numpy as np
+	if(isinstance(indexes, (list, tuple))):
+		if(len(indexes) == 0):
+			return bytes()
+		indexes = np.stack(indexes)
+	indexes = np.asarray(indexes, dtype=np.uint8)
+	if(indexes.max(initial=0) > 0x0F):
+		raise ValueError("palette index does not fit in 4 bits")
+	width = indexes.shape[-1] & ~1
+	packed = (indexes[..., 0:width:2] << 4) | indexes[..., 1:width:2]
+	return packed.tobytes()
+
+class readMode(Enum):
+	NONE = 0
+	FILE = 1
+	NAME = 2
+	SPRITESIZE = 3
+	FRAMES = 4
+	ANIMATIONS = 5
+	PALETTE = 6
+
+
+
+
+#
+# name = ""
+# filename = ""
+#
+# # parse arguments
+# parser = argparse.ArgumentParser(formatter_class=argparse.RawTextHelpFormatter,
+#     description='Converts a Spritesheet and png file to Commander X16 sprite data.\n\n'
+#     'Examples:\n\n'
+#     'spritesheetparser.py -s sheet1.spritesheet sheet1.inc\n')
+# parser.add_argument('output', help='the output file name')
+# parser.add_argument('-f', default='c', choices=['c','basic','acme'], help='output format: c for C array, basic for BASIC, acme for ACME assembler, default: c')
+# parser.add_argument('-s', help='File that contains the spritesheet description')
+# args = parser.parse_args()
+#
+
+# default x16 palette
+# default_palette = [
+# 0x0000,0xfff,0x800,0xafe,0xc4c,0x0c5,0x00a,0xee7,0xd85,0x640,0xf77,0x333,0x777,0xaf6,0x08f,0xbbb,0x000,0x111,0x222,0x333,0x444,0x555,0x666,0x777,0x888,0x999,0xaaa,0xbbb,0xccc,0xddd,0xeee,0xfff,0x211,0x433,0x644,0x866,0xa88,0xc99,0xfbb,0x211,0x422,0x633,0x844,0xa55,0xc66,0xf77,0x200,0x411,0x611,0x822,0xa22,0xc33,0xf33,0x200,0x400,0x600,0x800,0xa00,0xc00,0xf00,0x221,0x443,0x664,0x886,0xaa8,0xcc9,0xfeb,0x211,0x432,0x653,0x874,0xa95,0xcb6,0xfd7,0x210,0x431,0x651,0x862,0xa82,0xca3,0xfc3,0x210,0x430,0x640,0x860,0xa80,0xc90,0xfb0,0x121,0x343,0x564,0x786,0x9a8,0xbc9,0xdfb,0x121,0x342,0x463,0x684,0x8a5,0x9c6,0xbf7,0x120,0x241,0x461,0x582,0x6a2,0x8c3,0x9f3,0x120,0x240,0x360,0x480,0x5a0,0x6c0,0x7f0,0x121,0x343,0x465,0x686,0x8a8,0x9ca,0xbfc,0x121,0x242,0x364,0x485,0x5a6,0x6c8,0x7f9,0x020,0x141,0x162,0x283,0x2a4,0x3c5,0x3f6,0x020,0x041,0x061,0x082,0x0a2,0x0c3,0x0f3,0x122,0x344,0x466,0x688,0x8aa,0x9cc,0xbff,0x122,0x244,0x366,0x488,0x5aa,0x6cc,0x7ff,0x022,0x144,0x166,0x288,0x2aa,0x3cc,0x3ff,0x022,0x044,0x066,0x088,0x0aa,0x0cc,0x0ff,0x112,0x334,0x456,0x668,0x88a,0x9ac,0xbcf,0x112,0x224,0x346,0x458,0x56a,0x68c,0x79f,0x002,0x114,0x126,0x238,0x24a,0x35c,0x36f,0x002,0x014,0x016,0x028,0x02a,0x03c,0x03f,0x112,0x334,0x546,0x768,0x98a,0xb9c,0xdbf,0x112,0x324,0x436,0x648,0x85a,0x96c,0xb7f,0x102,0x214,0x416,0x528,0x62a,0x83c,0x93f,0x102,0x204,0x306,0x408,0x50a,0x60c,0x70f,0x212,0x434,0x646,0x868,0xa8a,0xc9c,0xfbe,0x211,0x423,0x635,0x847,0xa59,0xc6b,0xf7d,0x201,0x413,0x615,0x826,0xa28,0xc3a,0xf3c,0x201,0x403,0x604,0x806,0xa08,0xc09,0xf0b
+# ]
+# default_palette.reverse()
+
+
+
+#!dedup merges identical frames, "!dedup mirror" also merges a sprite frame with
+# the mirror image of another and marks it with bit 7 of the animation table's
+# frame index, which the engine must then draw flipped
+DEDUP_SAME = 1
+DEDUP_MIRROR = 2
+FRAME_FLIP_H = 0x80
+
+#"!compress <codec>" packs the sheet's data file, see tools/MAPFORMAT.md.
+# "auto" keeps the smallest codec, or stores the data in the container if
+# packing does not pay off, so such a sheet is always in the container.
+COMPRESS_AUTO = "auto"
+
+class SpriteSheet:
+	def __init__(self, spritename, sheetFilename, filename, tilemode, spriteSize, frames, animations, palette, dedup = 0, compress = "none"):
+		self.spritename = spritename
+		self.sheetFilename = sheetFilename
+		self.filename = filename
+		self.tilemode = tilemode
+		self.spriteSize = spriteSize
+		self.frames = frames
+		self.animations = animations
+		self.palette = palette
+		self.dedup = dedup
+		self.compress = compress
+
+	def dataFilename(self):
+		if(self.tilemode == 0):
+			return self.spritename.upper() + ".SPR"
+		else:
+			return self.spritename.upper() + ".TSH"
+
+	#Where the remap of a deduplicated sheet goes
+	def remapFilename(self):
+		return tile_remap_filename(self.filename)
+
+#Reads the .spritesheet description only, the image is loaded later
+def readSpriteSheet(spritename, tilemode = 0):
+
+	mode = readMode.NONE;
+
+	spriteSize = (0,0)
+	frames = []
+	animations = []
+
+
+	palette = {0: Color(0,0,0)}
+	nextpaletteentry = 1
+	dedup = 0
+	compress = "none"
+	sheetFilename = "images/" + spritename + ".spritesheet"
+	filename = sheetFilename
+	with open(sheetFilename, "r") as fileIn:
+		f1 = fileIn.readlines()
+		for x in f1:
+			if(x.startswith("!")):
+				if(x == "!file\n"):
+					mode = readMode.FILE
+				if(x == "!name\n"):
+					mode = readMode.NAME
+				if(x == "!spritesize\n"):
+					mode = readMode.SPRITESIZE
+				if(x == "!frames\n"):
+					mode = readMode.FRAMES
+				if(x == "!animations\n"):
+					mode = readMode.ANIMATIONS
+				if(x == "!tile\n"):
+					tilemode = 1
+				if(x == "!dedup\n"):
+					dedup = DEDUP_SAME
+				if(x == "!dedup mirror\n"):
+					dedup = DEDUP_MIRROR
+				if(x.startswith("!compress ")):
+					compress = x[len("!compress "):].strip()
+					if(compress != COMPRESS_AUTO and compress not in x16pack.CODECS):
+						raise ValueError("%s: unknown codec \"%s\", use one of %s" % (sheetFilename, compress, ", ".join(sorted(x16pack.CODECS) + [COMPRESS_AUTO])))
+				if(x == "!palette\n"):
+					mode = readMode.PALETTE
+			elif(len(x)!=1):
+				if(mode == readMode.FILE):
+					x = x.strip("\n ")
+					filename = x
+				elif(mode == readMode.NAME):
+					x = x.strip("\n ")
+					name = x
+				elif(mode == readMode.SPRITESIZE):
+					x = x.strip("\n ")
+					x=x.split(",")
+					if(len(x)!=2):
+						print("ERROR!  improper sprite size\n")
+						break
+					spriteSize = (int(x[0]),int(x[1]))
+
+				elif(mode == readMode.FRAMES):
+					if(tilemode == 1):
+						x = x.strip("\n")
+						x = x.split(",")
+						x_tiles = int(x[0])
+						y_tiles = int(x[1])
+						x_pixel_size = spriteSize[0]
+						y_pixel_size = spriteSize[1]
+						for row in range(y_tiles):
+							for col in range(x_tiles):
+								x_coord = col * x_pixel_size
+								y_coord = row * y_pixel_size
+								frames.append(Frame(int(x_coord),int(y_coord)))
+					else:
+						x = x.strip("\n")
+						x = x.split(":")
+						key = int(x[0])
+						x = x[1].split(",")
+						frames.append(Frame(int(x[0]),int(x[1])))
+
+				elif(mode == readMode.ANIMATIONS):
+					x = x.strip("\n")
+					x = x.split(":")
+					key = int(x[0])
+					framesStrings = x[1].split(",")
+					frameList = []
+					for frame in framesStrings:
+						x = frame.split("~")
+						frameKey = x[0]
+						frameDuration = x[1]
+						frameList.append((int(frameKey),int(frameDuration)))
+
+					animations.append(Animation(frameList))
+
+				elif(mode == readMode.PALETTE):
+					x = x.strip("\n")
+					x = x.split(",")
+					red = int(x[0],16)
+					green = int(x[1],16)
+					blue = int(x[2],16)
+					palette[nextpaletteentry] = Color(red,green,blue)
+					nextpaletteentry += 1
+
+
+		fileIn.close()
+
+	return SpriteSheet(spritename, sheetFilename, filename, tilemode, spriteSize, frames, animations, palette, dedup, compress)
+
+#Collapses frames that equal an earlier frame or, with the flips given, one of
+# its mirror images.  Returns the unique frames and, for every frame,
+# [unique frame, H flip, V flip]: the unique frame drawn with those flips
+# gives back the original.
+def dedupFrames(planes, flips = ((0,0),)):
+	unique = []
+	seen = {}
+	remap = []
+	for plane in planes:
+		for flipH, flipV in flips:
+			key = plane[::-1 if flipV else 1, ::-1 if flipH else 1].tobytes()
+			if(key in seen):
+				remap.append([seen[key], flipH, flipV])
+				break
+		else:
+			seen[plane.tobytes()] = len(unique)
+			remap.append([len(unique), 0, 0])
+			unique.append(plane)
+	return unique, remap
+
+#Converts the sheet's image into the contents of its .SPR or .TSH file,
+# packed if the sheet asks for it.  Deduplicated sheets also return their
+# remap, otherwise it is None.
+def spriteData(sheet):
+	#Pillow and NumPy are only loaded once a sheet has to be converted
+	from PIL import Image
+	import numpy as np
+	spriteSize = sheet.spriteSize
+	# load image
+	im = Image.open(sheet.filename)
+	# palettelist = im.getpalette()
+	# print(palettelist)
+	# palette = {}
+	# for i in range(16):
+	# 	red = palettelist[i*3]
+	# 	green = palettelist[i*3+1]
+	# 	blue = palettelist[i*3+2]
+	# 	palette[i] = Color(red, green, blue)
+	#
+	# print(palette[2].red)
+	# print(palette[2].green)
+	# print(palette[2].blue)
+	#Pillow only decodes the image here
+	with stage("image load") as timing:
+		p = np.array(im)
+		timing.pixels = p.shape[0] * p.shape[1]
+	with stage("quantize", pixels=p.shape[0] * p.shape[1]):
+		indexes = quantize(p, sheet.palette)
+
+	#data file output
+	framePlanes = []
+	for frame in sheet.frames:
+		framePlanes.append(indexes[frame.y_offset:frame.y_offset+spriteSize[1], frame.x_offset:frame.x_offset+spriteSize[0]])
+	remap = None
+	if(sheet.dedup):
+		#Tiles can use every flip through the tilemap, sprites only the
+		# H flip of the animation table and only when the sheet asks for it
+		if(sheet.tilemode == 1):
+			flips = ((0,0), (1,0), (0,1), (1,1))
+		elif(sheet.dedup == DEDUP_MIRROR):
+			flips = ((0,0), (1,0))
+		else:
+			flips = ((0,0),)
+		with stage("dedup", pixels=len(framePlanes) * spriteSize[0] * spriteSize[1]):
+			framePlanes, remap = dedupFrames(framePlanes, flips)
+	with stage("pack", pixels=len(framePlanes) * spriteSize[0] * spriteSize[1]):
+		data = bytes(b'\x00\x00') + pack_4bpp(framePlanes)
+	if(sheet.compress != "none"):
+		with stage("compress"):
+			codec = x16pack.best_codec(data[2:]) if sheet.compress == COMPRESS_AUTO else x16pack.CODECS[sheet.compress]
+			data = x16pack.pack_file_data(data, codec)
+	return data, remap
+
+#Builds the sheet's SPRITE.IND record, empty for tile sheets.  With the remap
+# of a deduplicated sheet only the unique frames are counted and the
+# animations point at them, with FRAME_FLIP_H set for mirrored frames.
+def indexRecord(sheet, remap = None):
+	spriteSize = sheet.spriteSize
+	frames = sheet.frames
+	animations = sheet.animations
+	# info table file output
+	record = BinaryWriter()
+	if(sheet.tilemode==0):
+		# fileOut.write("%s_data:\n" % name)
+		# fileOut.write("	!16 $0000 ;Vram offset will be set here\n") #Will be populated in game by vram offset
+		record.write_word(0)
+		# fileOut.write("	!16 $%04x ; Frame offset\n" % (spriteSize[0]*spriteSize[1]//2)) # frame offset
+		record.write_word((spriteSize[0]*spriteSize[1]//2))
+		# fileOut.write("	!8 $%02x ;number of frames\n" % len(frames)) #Number of frames
+		frameCount = len(frames)
+		if(remap is not None):
+			frameCount = max(int(entry[0]) for entry in remap) + 1 if len(remap) > 0 else 0
+		record.write_byte(frameCount)
+		# fileOut.write("	!8 $%02x ;number of animations\n" % len(animations)) #Number of frames
+		record.write_byte(len(animations))
+		#write animation data
+	    # animations can have up to 4 frames
+	    # data is layed out
+	    # {FRAME INDEX 1} {DURATION} {FRAME INDEX 2} {DURATION} {FRAME INDEX 3} {DURATION} {FRAME INDEX 4} {DURATION}
+		#fileOut.write("%s_animations:\n" % name)
+
+		for animation in animations:
+			# fileOut.write("    !byte ")
+			for i in range(0,4):
+				if(len(animation.frame_array) <= i):
+					#fileOut.write("$%02x,$%02x" % (0,0))
+					record.write_word(0)
+				else:
+					frame = animation.frame_array[i]
+					# fileOut.write("$%02x,$%02x" % (frame[0],frame[1]))
+					record.write_byte(remapFrame(sheet, remap, frame[0]))
+					record.write_byte(frame[1])
+
+			# fileOut.write("\n")
+
+		record.write_string(sheet.spritename + ".spr")
+		# fileOut.write("%s_filename_length:\n" %name)
+		# fileOut.write("	!byte %s\n" %(len(name)+2))
+		# fileOut.write("%s_filename:\n" %name)
+		# fileOut.write("	!pet \"%s.o\"" % name)
+
+		# fileOut.close()
+
+	return record.getvalue()
+
+#The animation table's frame byte for a frame of the sheet
+def remapFrame(sheet, remap, frameIndex):
+	if(remap is None or frameIndex >= len(remap)):
+		return frameIndex
+	unique, flipH = int(remap[frameIndex][0]), int(remap[frameIndex][1])
+	if(sheet.dedup == DEDUP_MIRROR and unique >= FRAME_FLIP_H):
+		raise ValueError("%s: frame %d is unique frame %d, !dedup mirror needs the frames to fit in 7 bits" % (sheet.sheetFilename, frameIndex, unique))
+	return unique | (FRAME_FLIP_H if flipH else 0)
+
+#Builds SPRITE.IND from the sprite sheets' records: the number of sprites, a
+# table of offsets and then the records themselves
+def buildSpriteIndex(records):
+	index = BinaryWriter()
+	index.write_byte(len(records))
+
+	#for each sprite, leave 16 bit entries blank for now
+	for i in range(len(records)):
+		index.write_word(0)
+
+
+	#write each index entry
+	for i in range(len(records)):
+		# write address offset
+		current_address = len(index) - 1 #the first byte is not counted
+		index.patch_word(1+2*i, current_address)
+		#write address entry
+		index.extend(records[i])
+
+	return bytes(b'\x00\x00') + index.getvalue()
+
+#Worker side of the conversion: everything a sheet needs, returned to the
+# parent instead of written so that only the parent touches the files
+def convertSpriteSheet(sheet):
+	data, remap = spriteData(sheet)
+	return indexRecord(sheet, remap), data, remap
+
+#The remap is named after the image's base name, which is all a Tiled
+# tileset gives the map compiler to find it.  Sheets may only share a remap
+# file when they convert the same image the same way; otherwise one would
+# overwrite the other's remap, or delete it as stale.
+def checkRemapNames(sheets):
+	owners = {}
+	for sheet in sheets:
+		key = (os.path.normpath(sheet.filename), sheet.tilemode, sheet.dedup)
+		other, otherKey = owners.setdefault(sheet.remapFilename(), (sheet, key))
+		if(otherKey != key and (sheet.dedup or other.dedup)):
+			raise ValueError("%s and %s would both use %s, only sheets that convert the same image with the same !dedup can share it" % (other.sheetFilename, sheet.sheetFilename, sheet.remapFilename()))
+
+#Converts the sheets and returns their SPRITE.IND records in the same order.
+# With a build cache only sheets whose description, image or tools changed
+# (or whose output is missing) are converted again.  With more than one job
+# the conversions run in a process pool; the files and the cache are still
+# written here, in config order, so the output does not depend on -jobs.
+def convertSpriteSheets(sheets, cache = None, jobs = 1):
+	checkRemapNames(sheets)
+	stale = [sheet for sheet in sheets if cache is None or not cache.up_to_date(sheet.sheetFilename)]
+	if(jobs > 1 and len(stale) > 1):
+		#The per sheet stages run in the workers and are not timed one by one
+		with stage("sheets in %d workers" % min(jobs, len(stale))):
+			from concurrent.futures import ProcessPoolExecutor
+			with ProcessPoolExecutor(max_workers=min(jobs, len(stale))) as pool:
+				results = list(pool.map(convertSpriteSheet, stale))
+	else:
+		results = []
+		for sheet in stale:
+			with stage("sheet " + sheet.spritename):
+				results.append(convertSpriteSheet(sheet))
+
+	records = {}
+	for sheet, (record, data, remap) in zip(stale, results):
+		with open(sheet.dataFilename(), "wb") as fileOut:
+			fileOut.write(data)
+		outputs = [sheet.dataFilename()]
+		#buildlevels remaps the maps drawn with a deduplicated tileset, and the
+		# records of up to date sprite sheets are rebuilt from it
+		if(remap is not None):
+			write_if_changed(sheet.remapFilename(), encode_tile_remap(sheet.filename, remap).encode())
+			outputs.append(sheet.remapFilename())
+		elif(os.path.exists(sheet.remapFilename())):
+			os.remove(sheet.remapFilename())
+		if(cache is not None):
+			cache.record(sheet.sheetFilename, [sheet.sheetFilename, sheet.filename] + TOOL_SOURCES, outputs)
+		records[sheet.sheetFilename] = record
+	for sheet in sheets:
+		if(sheet.sheetFilename not in records):
+			remap = load_tile_remap(sheet.remapFilename()) if sheet.dedup else None
+			records[sheet.sheetFilename] = indexRecord(sheet, remap)
+	return [records[sheet.sheetFilename] for sheet in sheets]
+
+#Reads the sprite config: sprite sheet names, then after a blank line the tile sheet names
+def readSpriteConfig(filename):
+	spritenames = []
+	tilenames = []
+
+	with open(filename, "r") as read_file:
+		f1 = read_file.readlines()
+		i = 0
+		readingTiles = 0
+		ilen = len(f1)
+		while(i < ilen):
+			string = f1[i].strip(' \n')
+			if(len(string)>0):
+				if(not readingTiles):
+					spritenames.append(string)
+				else:
+					tilenames.append(string)
+			else:
+				readingTiles = 1
+			i+=1
+
+	return spritenames, tilenames
+
+#Converts the sheets of a sprite config that are out of date and writes
+# SPRITE.IND if it changed.  Returns the data files that were written.
+def buildSprites(configFilename, cache, jobs = 1):
+	with stage("config parse"):
+		spritenames, tilenames = readSpriteConfig(configFilename)
+		sheets = [readSpriteSheet(name, 0) for name in spritenames] + [readSpriteSheet(name, 1) for name in tilenames]
+
+	written = [sheet.dataFilename() for sheet in sheets if not cache.up_to_date(sheet.sheetFilename)]
+	records = convertSpriteSheets(sheets, cache, jobs)
+
+	with stage("index assembly"):
+		#write index file, only touched when an entry changed
+		write_if_changed('SPRITE.IND', buildSpriteIndex(records[:len(spritenames)]))
+
+	cache.save()
+	return written
+
+
+TOOL_SOURCES = tool_sources(sys.modules[__name__], "x16assets.colormatch", binarywriter, tiledmap, x16pack)
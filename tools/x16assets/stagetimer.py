@@ -0,0 +1,123 @@
+#!/usr/bin/python3
+
+# Per stage timings for the build tools (-timings / -profile).
+#
+# The tools wrap their named stages in "with stage(name):".  Until enable()
+# is called that costs next to nothing.  When enabled, every stage records
+# its wall time, the pixels or tiles it handled and the peak RSS of the
+# process when it finished.  report() prints a table and write_profile()
+# saves either a cProfile dump or, for a .json file name, a Chrome trace
+# (chrome://tracing or https://ui.perfetto.dev).
+
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+#resource is not available on Windows, peak RSS is left out there
+try:
+	import resource
+except ImportError:
+	resource = None
+
+class StageStats:
+	def __init__(self, name):
+		self.name = name
+		self.calls = 0
+		self.seconds = 0.0
+		self.pixels = 0
+		self.tiles = 0
+		self.peak_rss = 0
+
+#What a running stage can fill in, e.g. once it knows how many tiles it handled
+class StageRecord:
+	def __init__(self, pixels, tiles):
+		self.pixels = pixels
+		self.tiles = tiles
+
+#Peak resident set size of this process so far in bytes, 0 if unknown
+def peak_rss():
+	if(resource is None):
+		return 0
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	#Linux reports kilobytes, macOS bytes
+	return peak if sys.platform == "darwin" else peak * 1024
+
+class StageTimer:
+	def __init__(self):
+		self.enabled = False
+		self.stats = {}
+		self.events = []
+		self.profiler = None
+		self.start = time.perf_counter()
+
+	def enable(self, profile=None):
+		self.enabled = True
+		self.start = time.perf_counter()
+		if(profile is not None and not profile.endswith(".json")):
+			import cProfile
+			self.profiler = cProfile.Profile()
+			self.profiler.enable()
+
+	@contextmanager
+	def stage(self, name, pixels=0, tiles=0):
+		if(not self.enabled):
+			yield StageRecord(pixels, tiles)
+			return
+		record = StageRecord(pixels, tiles)
+		begin = time.perf_counter()
+		try:
+			yield record
+		finally:
+			end = time.perf_counter()
+			stats = self.stats.get(name)
+			if(stats is None):
+				stats = self.stats[name] = StageStats(name)
+			stats.calls += 1
+			stats.seconds += end - begin
+			stats.pixels += record.pixels
+			stats.tiles += record.tiles
+			stats.peak_rss = max(stats.peak_rss, peak_rss())
+			self.events.append({"name": name, "ph": "X", "pid": os.getpid(), "tid": 0,
+				"ts": (begin - self.start) * 1e6, "dur": (end - begin) * 1e6})
+
+	def report(self, fileOut=sys.stdout):
+		if(not self.enabled):
+			return
+		fileOut.write("%-40s %5s %10s %12s %12s %9s\n" % ("stage", "calls", "wall ms", "pixels/s", "tiles/s", "peak MB"))
+		for stats in self.stats.values():
+			pixelRate = "%12.0f" % (stats.pixels / stats.seconds) if stats.pixels and stats.seconds > 0 else "%12s" % "-"
+			tileRate = "%12.0f" % (stats.tiles / stats.seconds) if stats.tiles and stats.seconds > 0 else "%12s" % "-"
+			peak = "%9.1f" % (stats.peak_rss / 1048576) if stats.peak_rss else "%9s" % "-"
+			fileOut.write("%-40s %5d %10.2f %s %s %s\n" % (stats.name[:40], stats.calls, stats.seconds * 1000, pixelRate, tileRate, peak))
+		fileOut.write("%-40s %5s %10.2f\n" % ("total", "", (time.perf_counter() - self.start) * 1000))
+
+	#A .json file name gets a Chrome trace of the stages, anything else the cProfile stats
+	def write_profile(self, filename):
+		if(filename.endswith(".json")):
+			with open(filename, "w") as fileOut:
+				json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, fileOut)
+		elif(self.profiler is not None):
+			self.profiler.disable()
+			self.profiler.dump_stats(filename)
+
+timer = StageTimer()
+
+def stage(name, pixels=0, tiles=0):
+	return timer.stage(name, pixels, tiles)
+
+#Adds -timings and -profile to a tool's argument parser
+def add_arguments(parser):
+	parser.add_argument('-timings', action='store_true', help='print the wall time, throughput and peak memory of each build stage')
+	parser.add_argument('-profile', metavar='FILE', help='also write a profile: a Chrome trace for FILE.json, cProfile stats otherwise')
+
+def start(args):
+	if(args.timings or args.profile):
+		timer.enable(args.profile)
+
+def finish(args):
+	if(args.profile):
+		timer.write_profile(args.profile)
+	if(args.timings or args.profile):
+		timer.report()
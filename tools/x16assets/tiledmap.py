@@ -0,0 +1,216 @@
+#!/usr/bin/python3
+
+# Shared helpers for turning Tiled map layers into X16 tilemap data.
+
+import base64
+import gzip
+import json
+import os
+import re
+import zlib
+#NumPy is imported by the functions that use it, so tools that only read
+# the json (or just print their help) start quickly
+
+#Tiled layers are read with a fixed row stride of 256 tiles
+MAP_STRIDE = 256
+
+#Tiled stores the flips in the top bits of each global tile id
+FLIP_H = 1 << 31
+FLIP_V = 1 << 30
+GID_MASK = 0x0FFFFFFF
+
+#Encodes a layer into X16 tilemap entries, two bytes per tile:
+#  low byte:  tile number bits 0-7
+#  high byte: tile number bits 8-9, H flip (bit 2), V flip (bit 3), palette offset 0
+#Tiled numbers tiles from 1, so the empty tile 0 wraps around to $ff/$0f.
+#A remap from a deduplicated tile sheet (see load_tile_remap) replaces each
+# tile by its unique tile, toggling the flips that turn one into the other.
+def encode_tilemap(data, width, height, stride=MAP_STRIDE, remap=None):
+	import numpy as np
+	data = np.asarray(data, dtype=np.uint32).reshape(-1)
+	if(height == 0 or width == 0):
+		return bytes()
+	needed = (height - 1) * stride + width
+	if(len(data) < needed):
+		raise IndexError("layer has %d tiles, %d needed for %dx%d" % (len(data), needed, width, height))
+	rows = np.zeros(height * stride, dtype=np.uint32)
+	count = min(len(data), len(rows))
+	rows[:count] = data[:count]
+	tiles = rows.reshape(height, stride)[:, :width]
+	if(remap is not None):
+		tiles = remap_tiles(tiles, remap)
+	tiles = tiles - np.uint32(1)
+
+	flipH = (tiles >> 31) & 1
+	flipV = (tiles >> 30) & 1
+	#tileFlippedDiagonally (bit 29) should not be used
+	encoded = np.empty((height, width, 2), dtype=np.uint8)
+	encoded[..., 0] = tiles & 0xFF
+	encoded[..., 1] = ((tiles >> 8) & 0x03) | (flipH << 2) | (flipV << 3)
+	return encoded.tobytes()
+
+#Applies a tile remap to global tile ids.  Empty tiles and ids past the end
+# of the remap are left alone.
+def remap_tiles(gids, remap):
+	import numpy as np
+	gids = np.array(gids, dtype=np.uint32)
+	ids = gids & np.uint32(GID_MASK)
+	mapped = (ids >= 1) & (ids <= len(remap))
+	entries = remap[ids[mapped] - 1]
+	flips = gids[mapped] & np.uint32(FLIP_H | FLIP_V)
+	flips ^= (entries[:, 1] << 31) | (entries[:, 2] << 30)
+	gids[mapped] = (entries[:, 0] + 1) | flips
+	return gids
+
+#Tile sheets built with !dedup store which unique tile stands in for each
+# tile of the image, so maps drawn in Tiled with the full tileset can be
+# remapped.  The file is named after the image, which a Tiled tileset names
+# too, e.g. images/testtiles.png -> testtiles.remap.json.
+def tile_remap_filename(image):
+	return os.path.splitext(os.path.basename(image))[0].lower() + ".remap.json"
+
+#remap holds [unique tile, H flip, V flip] for every tile of the image
+def encode_tile_remap(image, remap):
+	unique = max(entry[0] for entry in remap) + 1 if len(remap) > 0 else 0
+	#One tile per line keeps the file readable and diffable
+	entries = ",\n".join("  [%d, %d, %d]" % tuple(entry) for entry in remap)
+	return '{\n "image": %s,\n "tiles": %d,\n "unique": %d,\n "remap": [\n%s\n ]\n}\n' % (json.dumps(image), len(remap), unique, entries)
+
+#Returns the remap as an (N,3) uint32 array, or None if the file does not exist
+def load_tile_remap(filename):
+	import numpy as np
+	try:
+		with open(filename, "r") as fileIn:
+			remap = json.load(fileIn)["remap"]
+	except FileNotFoundError:
+		return None
+	return np.array(remap, dtype=np.uint32).reshape(-1, 3)
+
+#Layer data compressed with zstd needs the optional zstandard package
+# (or the compression.zstd module of Python 3.14+)
+def zstd_decompress(raw):
+	try:
+		from compression import zstd
+		return zstd.decompress(raw)
+	except ImportError:
+		pass
+	try:
+		import zstandard
+	except ImportError:
+		raise ImportError("layer data is zstd compressed: install the zstandard package (pip install zstandard) or re-export the map with zlib/gzip compression")
+	return zstandard.ZstdDecompressor().decompressobj().decompress(raw)
+
+decompressors = {
+	"": lambda raw: raw,
+	"zlib": zlib.decompress,
+	"gzip": gzip.decompress,
+	"zstd": zstd_decompress,
+}
+
+#Decodes a layer's "data" into a uint32 array of global tile ids.  Plain
+# JSON arrays are converted as they are; base64 data is decoded (and
+# decompressed) straight into the array without a list of ints in between.
+def decode_layer_data(data, encoding=None, compression=None):
+	import numpy as np
+	if(isinstance(data, np.ndarray)):
+		return data.astype(np.uint32, copy=False)
+	if(not isinstance(data, str)):
+		return np.array(data, dtype=np.uint32)
+	if(encoding != "base64"):
+		raise ValueError("unsupported layer encoding %r" % encoding)
+	compression = compression or ""
+	if(compression not in decompressors):
+		raise ValueError("unsupported layer compression %r" % compression)
+	raw = decompressors[compression](base64.b64decode(data))
+	if(len(raw) % 4 != 0):
+		raise ValueError("layer data is %d bytes, not a whole number of tiles" % len(raw))
+	return np.frombuffer(raw, dtype="<u4").astype(np.uint32, copy=False)
+
+#object_hook for Tiled JSON: decodes the data of any layer (or chunk) object.
+# arrays holds the tile data load_tiled already parsed, referenced by index.
+def decode_layer(obj, arrays=None):
+	if("data" in obj):
+		data = obj["data"]
+		if(isinstance(data, int) and arrays is not None):
+			obj["data"] = arrays[data]
+		elif("encoding" in obj or isinstance(data, list)):
+			obj["data"] = decode_layer_data(data, obj.get("encoding"), obj.get("compression"))
+		obj.pop("encoding", None)
+		obj.pop("compression", None)
+	return obj
+
+#The key that introduces a layer's data array, and the text allowed inside it
+DATA_ARRAY = re.compile(r'"data"\s*:\s*\[\s*(?=\d)')
+TILE_IDS = re.compile(r"[\d\s,]*")
+
+def parse_tile_ids(text, parts):
+	import numpy as np
+	text = text.strip(" \t\r\n,")
+	if(len(text) == 0):
+		return
+	if(TILE_IDS.fullmatch(text) is None):
+		raise ValueError("layer data holds something other than tile ids")
+	parts.append(np.fromstring(text, dtype=np.uint32, sep=","))
+
+#Loads a Tiled JSON map with every layer's data as a uint32 array.  The file
+# is read in chunks and the "data" arrays are parsed into uint32 arrays as
+# they stream past, so neither the whole text nor one Python int object
+# (28+ bytes) per tile is ever held.  Only the small rest of the document
+# goes through json.  Base64 and compressed layers are decoded as well.
+def load_tiled(filename, chunk_size=1 << 16):
+	import numpy as np
+	skeleton = []
+	arrays = []
+	parts = None
+	buffer = ""
+	with open(filename, "r") as read_file:
+		while(True):
+			chunk = read_file.read(chunk_size)
+			buffer += chunk
+			while(True):
+				if(parts is None):
+					match = DATA_ARRAY.search(buffer)
+					if(match is None):
+						#keep a tail in case a "data" key is split between chunks
+						keep = 0 if len(chunk) == 0 else min(len(buffer), 64)
+						skeleton.append(buffer[:len(buffer) - keep])
+						buffer = buffer[len(buffer) - keep:]
+						break
+					skeleton.append(buffer[:match.start()] + '"data":%d' % len(arrays))
+					buffer = buffer[match.end():]
+					parts = []
+				else:
+					end = buffer.find("]")
+					if(end < 0):
+						if(len(chunk) == 0):
+							raise ValueError("%s: unterminated layer data" % filename)
+						cut = buffer.rfind(",") + 1
+						parse_tile_ids(buffer[:cut], parts)
+						buffer = buffer[cut:]
+						break
+					parse_tile_ids(buffer[:end], parts)
+					buffer = buffer[end + 1:]
+					arrays.append(np.concatenate(parts) if len(parts) > 0 else np.zeros(0, dtype=np.uint32))
+					parts = None
+			if(len(chunk) == 0):
+				break
+	return json.loads("".join(skeleton), object_hook=lambda obj: decode_layer(obj, arrays))
+
+#The map's "tilesets" array without parsing the layers.  Tiled writes it as a
+# top level key after "layers", so it is looked for from the end; anything
+# unexpected falls back to loading the whole map.
+TILESETS_KEY = re.compile(r'"tilesets"\s*:\s*(?=\[)')
+
+def load_tiled_tilesets(filename):
+	with open(filename, "r") as read_file:
+		text = read_file.read()
+	start = text.rfind('"tilesets"')
+	match = TILESETS_KEY.match(text, start) if start >= 0 else None
+	if(match is not None):
+		try:
+			tilesets = json.JSONDecoder().raw_decode(text, match.end())[0]
+			if(isinstance(tilesets, list)):
+				return tilesets
+		except ValueError:
+			pass
+	return json.loads(text)["tilesets"]
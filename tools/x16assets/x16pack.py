@@ -0,0 +1,229 @@
+# Compressed containers for the game's data files, see tools/MAPFORMAT.md.
+#
+# The data is cut into 8 KB blocks, one per bank of high RAM, and every
+# block is compressed on its own so the game can unpack a file straight
+# into its banks.  Two codecs suit a 6502 decompressor:
+#
+#   RLE16  runs of identical 16 bit words, which is what tilemaps and the
+#          zero filled entity pages are made of
+#   LZ     byte oriented LZ77 with 16 bit offsets back into the same block
+#
+# tools/x16pack.py unpacks files, checks that they round trip or reports how
+# well each codec does on them.
+
+import struct
+import sys
+import time
+
+MARKER = bytes(b'\xff\x5a') #$FF can not start an uncompressed .MAP, 'Z'
+CODEC_NONE = 0
+CODEC_RLE16 = 1
+CODEC_LZ = 2
+CODECS = {"none": CODEC_NONE, "rle16": CODEC_RLE16, "lz": CODEC_LZ}
+BLOCK_SIZE = 0x2000
+
+#RLE16: a control byte, then
+#  $00-$7f  n+1 literal words follow
+#  $80-$ff  the next word repeats (n & $7f)+2 times
+RLE_MAX_LITERALS = 128
+RLE_MAX_REPEAT = 129
+
+#LZ: a control byte, then
+#  $00-$7f  n+1 literal bytes follow
+#  $80-$ff  a 16 bit offset follows, copy (n & $7f)+3 bytes from that far back
+LZ_MAX_LITERALS = 128
+LZ_MIN_MATCH = 3
+LZ_MAX_MATCH = 130
+LZ_MAX_CHAIN = 32
+
+def rle16_encode(data):
+	if(len(data) % 2 == 1):
+		data = bytes(data) + bytes(1)
+	words = [data[i:i+2] for i in range(0, len(data), 2)]
+	out = bytearray()
+	literals = []
+	def flush():
+		while(len(literals) > 0):
+			chunk = literals[:RLE_MAX_LITERALS]
+			del literals[:RLE_MAX_LITERALS]
+			out.append(len(chunk) - 1)
+			out.extend(b"".join(chunk))
+	i = 0
+	while(i < len(words)):
+		run = 1
+		while(i + run < len(words) and run < RLE_MAX_REPEAT and words[i + run] == words[i]):
+			run += 1
+		if(run >= 2):
+			flush()
+			out.append(0x80 | (run - 2))
+			out.extend(words[i])
+		else:
+			literals.append(words[i])
+		i += run
+	flush()
+	return bytes(out)
+
+def rle16_decode(data, size):
+	out = bytearray()
+	i = 0
+	while(len(out) < size):
+		control = data[i]
+		i += 1
+		if(control < 0x80):
+			count = (control + 1) * 2
+			out.extend(data[i:i+count])
+			i += count
+		else:
+			out.extend(data[i:i+2] * ((control & 0x7f) + 2))
+			i += 2
+	return bytes(out[:size])
+
+def lz_encode(data):
+	data = bytes(data)
+	out = bytearray()
+	literals = bytearray()
+	chains = {}
+	def flush():
+		while(len(literals) > 0):
+			chunk = literals[:LZ_MAX_LITERALS]
+			del literals[:LZ_MAX_LITERALS]
+			out.append(len(chunk) - 1)
+			out.extend(chunk)
+	def remember(position):
+		key = data[position:position+LZ_MIN_MATCH]
+		chains.setdefault(key, []).append(position)
+	i = 0
+	while(i < len(data)):
+		bestLength = 0
+		bestOffset = 0
+		key = data[i:i+LZ_MIN_MATCH]
+		if(len(key) == LZ_MIN_MATCH):
+			limit = min(LZ_MAX_MATCH, len(data) - i)
+			for start in reversed(chains.get(key, [])[-LZ_MAX_CHAIN:]):
+				length = LZ_MIN_MATCH
+				while(length < limit and data[start + length] == data[i + length]):
+					length += 1
+				if(length > bestLength):
+					bestLength = length
+					bestOffset = i - start
+					if(length == limit):
+						break
+		if(bestLength >= LZ_MIN_MATCH):
+			flush()
+			out.append(0x80 | (bestLength - LZ_MIN_MATCH))
+			out.extend(struct.pack("<H", bestOffset))
+			for position in range(i, i + bestLength):
+				remember(position)
+			i += bestLength
+		else:
+			literals.append(data[i])
+			remember(i)
+			i += 1
+	flush()
+	return bytes(out)
+
+def lz_decode(data, size):
+	out = bytearray()
+	i = 0
+	while(len(out) < size):
+		control = data[i]
+		i += 1
+		if(control < 0x80):
+			count = control + 1
+			out.extend(data[i:i+count])
+			i += count
+		else:
+			length = (control & 0x7f) + LZ_MIN_MATCH
+			offset = struct.unpack_from("<H", data, i)[0]
+			i += 2
+			start = len(out) - offset
+			#Byte by byte, the copy may overlap what it writes
+			for j in range(length):
+				out.append(out[start + j])
+	return bytes(out[:size])
+
+encoders = {CODEC_NONE: bytes, CODEC_RLE16: rle16_encode, CODEC_LZ: lz_encode}
+decoders = {CODEC_NONE: lambda data, size: bytes(data[:size]), CODEC_RLE16: rle16_decode, CODEC_LZ: lz_decode}
+
+#Packs data (without the load address) into the container:
+#  $ff $5a, codec, uncompressed size (24 bit), then for each 8 KB block its
+#  compressed size (16 bit) and the compressed block
+def pack(data, codec):
+	data = bytes(data)
+	out = bytearray(MARKER)
+	out.append(codec)
+	out.extend(struct.pack("<I", len(data))[:3])
+	for start in range(0, len(data), BLOCK_SIZE):
+		block = encoders[codec](data[start:start+BLOCK_SIZE])
+		out.extend(struct.pack("<H", len(block)))
+		out.extend(block)
+	return bytes(out)
+
+#Raw data can start with the marker too, so the header also has to name a
+# known codec and its block sizes have to end exactly at the end of the data
+def is_packed(data):
+	data = bytes(data)
+	if(len(data) < 6 or data[:2] != MARKER or data[2] not in decoders):
+		return False
+	size = struct.unpack("<I", data[3:6] + bytes(1))[0]
+	i = 6
+	for start in range(0, size, BLOCK_SIZE):
+		if(i + 2 > len(data)):
+			return False
+		i += 2 + struct.unpack_from("<H", data, i)[0]
+	return i == len(data)
+
+#Unpacks a container made by pack()
+def unpack(data):
+	data = bytes(data)
+	if(not is_packed(data)):
+		raise ValueError("not a packed file")
+	codec = data[2]
+	if(codec not in decoders):
+		raise ValueError("unknown codec %d" % codec)
+	size = struct.unpack("<I", data[3:6] + bytes(1))[0]
+	out = bytearray()
+	i = 6
+	while(len(out) < size):
+		length = struct.unpack_from("<H", data, i)[0]
+		i += 2
+		out.extend(decoders[codec](data[i:i+length], min(BLOCK_SIZE, size - len(out))))
+		i += length
+	return bytes(out)
+
+#pack() that checks the reference decoder gives the data back
+def pack_checked(data, codec):
+	packed = pack(data, codec)
+	if(unpack(packed) != bytes(data)):
+		raise AssertionError("codec %d does not round trip" % codec)
+	return packed
+
+#The codec that packs data smallest, CODEC_NONE if packing does not pay off.
+# CODEC_NONE still goes into the container (stored), so a sheet that asks
+# for packing is always in the same form
+def best_codec(data):
+	sizes = {codec: len(pack(data, codec)) for codec in (CODEC_RLE16, CODEC_LZ)}
+	codec = min(sizes, key=sizes.get)
+	return codec if sizes[codec] < len(data) else CODEC_NONE
+
+#For files with the X16 two byte load address in front
+def pack_file_data(fileData, codec):
+	return bytes(fileData[:2]) + pack_checked(fileData[2:], codec)
+
+def unpack_file_data(fileData):
+	return bytes(fileData[:2]) + unpack(fileData[2:])
+
+#Size and speed of every codec on one file's data (without the load address)
+def report(name, data, fileOut=sys.stdout):
+	for codecName, codec in sorted(CODECS.items(), key=lambda item: item[1]):
+		if(codec == CODEC_NONE):
+			continue
+		start = time.perf_counter()
+		packed = pack(data, codec)
+		encodeTime = time.perf_counter() - start
+		start = time.perf_counter()
+		if(unpack(packed) != data):
+			raise AssertionError("%s: codec %s does not round trip" % (name, codecName))
+		decodeTime = time.perf_counter() - start
+		fileOut.write("%-20s %-6s %8d %8d %6.1f%% %10.2f %10.2f\n" % (name, codecName, len(data), len(packed),
+			100.0 * len(packed) / len(data) if len(data) else 0, len(data) / encodeTime / 1048576, len(data) / decodeTime / 1048576))
@@ -0,0 +1,47 @@
+#!/usr/bin/python3
+
+# Checks, unpacks or reports on files in the packed container format of
+# tools/MAPFORMAT.md, see x16assets/x16pack.py
+
+import argparse
+import os
+import sys
+from x16assets import x16pack
+
+parser = argparse.ArgumentParser(formatter_class=argparse.RawTextHelpFormatter,
+	description='Checks, unpacks or compares the codecs on files in the packed container format.\n\n'
+	'Examples:\n\n'
+	'x16pack.py -check L1.MAP\n'
+	'x16pack.py -unpack L1.MAP\n'
+	'x16pack.py -report *.SPR *.TSH *.MAP\n')
+parser.add_argument('files', nargs='+', help='files with their load address, packed or not')
+parser.add_argument('-unpack', action='store_true', help='write each packed file unpacked to FILE.raw')
+parser.add_argument('-check', action='store_true', help='unpack, repack with the same codec and compare')
+parser.add_argument('-report', action='store_true', help='print the size and MB/s of every codec for each file')
+args = parser.parse_args()
+
+if(args.report):
+	print("%-20s %-6s %8s %8s %7s %10s %10s" % ("file", "codec", "bytes", "packed", "ratio", "enc MB/s", "dec MB/s"))
+failed = False
+for filename in args.files:
+	with open(filename, "rb") as fileIn:
+		fileData = fileIn.read()
+	packed = x16pack.is_packed(fileData[2:])
+	raw = x16pack.unpack_file_data(fileData) if packed else fileData
+	if(args.report):
+		x16pack.report(os.path.basename(filename), raw[2:])
+	if(not packed):
+		if(args.check or args.unpack):
+			print("%s is not packed" % filename)
+			failed = True
+		continue
+	if(not args.report):
+		print("%s: codec %d, %d bytes unpacked from %d" % (filename, fileData[4], len(raw), len(fileData)))
+	if(args.check):
+		if(x16pack.pack_file_data(raw, fileData[4]) != fileData):
+			print("%s: repacking gives different bytes" % filename)
+			failed = True
+	if(args.unpack):
+		with open(filename + ".raw", "wb") as fileOut:
+			fileOut.write(raw)
+sys.exit(1 if failed else 0)